@@ -1,96 +1,148 @@
 import os
 import sqlite3
+import numpy as np
 import pandas as pd
 import streamlit as st
 import yaml
-import requests
 from pathlib import Path
 import sys
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 from bot.config_loader import load_config
-from bot.broker import Broker
+from bot import exchanges
+from bot.broker import CANDLES, Broker
+from bot.datastore import OHLCVStore
+from bot import journal
+from bot import lod
 
 CONFIG_PATH = Path(__file__).resolve().parents[1] / "config" / "config.yaml"
 DB_PATH = Path(__file__).resolve().parents[1] / "storage" / "journal.db"
 KILL_FLAG = Path(__file__).resolve().parents[1] / "storage" / "kill.flag"
 
+PRODUCTS_TTL = 3600
+CANDLES_TTL = 15
+TRADES_TTL = 2.0
+EQUITY_WINDOW_MS = 30 * 86_400_000
+CHART_BUCKETS = 1200  # about one candle per pixel column of a wide chart
+MODES = ["paper", "sim", "live"]
+
 # --------------------------- DATABASE ---------------------------
+@st.cache_resource
 def init_db():
     DB_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with sqlite3.connect(DB_PATH) as con:
-        con.execute("""
-            CREATE TABLE IF NOT EXISTS trades (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                symbol TEXT,
-                side TEXT,
-                price REAL,
-                qty REAL,
-                fee REAL,
-                pnl REAL
-            )
-        """)
-
-def read_trades(symbol=None):
-    if not DB_PATH.exists():
-        return pd.DataFrame()
-
-    with sqlite3.connect(DB_PATH) as con:
-        query = "SELECT * FROM trades"
-        if symbol:
-            query += " WHERE symbol = ? ORDER BY timestamp DESC"
-            df = pd.read_sql(query, con, params=(symbol,))
-        else:
-            query += " ORDER BY timestamp DESC"
-            df = pd.read_sql(query, con)
+    journal.init_db(DB_PATH)
 
-    if not df.empty and "timestamp" in df.columns:
-        def clean_timestamp(ts):
-            try:
-                ts = str(ts).replace("EDT", "").replace("UTC", "").strip()
-                return pd.to_datetime(ts, utc=True, errors='coerce')
-            except Exception:
-                return pd.NaT
+@st.cache_resource
+def trade_history():
+    """One incrementally loaded trade table shared by every session."""
+    return journal.TradeHistory(DB_PATH, min_interval=TRADES_TTL)
 
-        df["timestamp"] = df["timestamp"].apply(clean_timestamp)
-        df = df.dropna(subset=["timestamp"])
+def read_trades(symbol=None, since_ms=None, until_ms=None):
+    df = trade_history().frame()
+    if df is None or df.empty:
+        return pd.DataFrame()
 
-    return df
+    mask = df["ts"].notna()
+    if symbol:
+        mask &= df["symbol"] == symbol
+    if since_ms is not None:
+        mask &= df["ts"] >= since_ms
+    if until_ms is not None:
+        mask &= df["ts"] < until_ms
+    return df[mask].sort_values("ts", ascending=False)
+
+@st.cache_data(ttl=TRADES_TTL, show_spinner=False)
+def read_equity(since_ms=None):
+    """Portfolio snapshots written by the bot (bot.portfolio), oldest first."""
+    with sqlite3.connect(DB_PATH) as con:
+        return pd.read_sql("SELECT * FROM equity WHERE ts >= ? ORDER BY ts", con, params=[since_ms or 0])
 
 # --------------------------- API ---------------------------
+@st.cache_data(ttl=PRODUCTS_TTL, show_spinner=False)
+def _products():
+    import requests
+    resp = requests.get("https://api.coinbase.com/api/v3/brokerage/products", timeout=5)
+    resp.raise_for_status()
+    return sorted([p.get("product_id") for p in resp.json().get("products", []) if p.get("product_id")])
+
 def fetch_products():
+    # Failures are not cached, so the next rerun tries again.
     try:
-        resp = requests.get("https://api.coinbase.com/api/v3/brokerage/products", timeout=5)
-        resp.raise_for_status()
-        return sorted([p.get("product_id") for p in resp.json().get("products", []) if p.get("product_id")])
+        return _products()
     except Exception as e:
         st.warning(f"Could not fetch products: {e}")
         return []
 
-# --------------------------- CHART ---------------------------
-def plot_candles_ema(df, trades, ema_fast, ema_slow):
+@st.cache_data(ttl=CANDLES_TTL, show_spinner=False)
+def fetch_candles(exchange_id, mode, symbol, timeframe, limit, rate_limit):
+    broker = Broker(exchange_id=exchange_id, mode=mode,
+                    limiter=exchanges.limiter_for({"exchange_id": exchange_id, "mode": mode, "rate_limit": rate_limit}))
+    df = broker.fetch_ohlcv(symbol, timeframe, limit=limit)
+    df["timestamp"] = pd.to_datetime(df["timestamp"], errors='coerce')
+    return df.dropna(subset=["timestamp"]).set_index("timestamp")
+
+@st.cache_resource
+def indicators():
+    return lod.IndicatorCache()
+
+def chart_columns(exchange_id, mode, symbol, timeframe, rate_limit):
+    """
+    Column arrays for the chart: the local store's history (memory-mapped)
+    plus any newer bars from the exchange, or just the recent exchange
+    bars when the store has nothing for this series.
+    """
+    recent = fetch_candles(exchange_id, mode, symbol, timeframe, 200, rate_limit)
+    recent_cols = {"timestamp": recent.index.as_unit("ms").asi8}
+    recent_cols.update({col: recent[col].to_numpy("float64") for col in lod.OHLC_COLUMNS[1:]})
+    if CANDLES.lake is None:
+        return recent_cols
+    stored = CANDLES.lake.series(exchange_id, symbol, timeframe).columns()
+    if not len(stored["timestamp"]):
+        return recent_cols
+    newer = recent_cols["timestamp"] > stored["timestamp"][-1]
+    if not newer.any():
+        return stored
+    return {col: np.concatenate([stored[col], recent_cols[col][newer]]) for col in lod.OHLC_COLUMNS}
+
+def plot_candles_ema(cols, trades, ema_fast, ema_slow, series_key, start_ms=None, end_ms=None,
+                     buckets=CHART_BUCKETS):
+    """
+    Candles, EMAs and trade markers between start_ms and end_ms, reduced to
+    about `buckets` points per trace. EMAs come from the whole series, so the
+    visible window starts warmed up.
+    """
     import plotly.graph_objects as go
-    df["ema_fast"] = df["close"].ewm(span=ema_fast).mean()
-    df["ema_slow"] = df["close"].ewm(span=ema_slow).mean()
+    ts = cols["timestamp"]
+    start_ms = int(ts[0]) if start_ms is None else start_ms
+    end_ms = int(ts[-1]) + 1 if end_ms is None else end_ms
+    lo, hi = np.searchsorted(ts, [start_ms, end_ms])
+    view = lod.window(cols, start_ms, end_ms)
+    bars = lod.downsample_ohlc(view, buckets)
+    to_dt = lambda ms: pd.to_datetime(ms, unit="ms", utc=True)
 
     fig = go.Figure()
     fig.add_trace(go.Candlestick(
-        x=df.index,
-        open=df["open"], high=df["high"], low=df["low"], close=df["close"], name="Price"
+        x=to_dt(bars["timestamp"]),
+        open=bars["open"], high=bars["high"], low=bars["low"], close=bars["close"], name="Price"
     ))
-    fig.add_trace(go.Scatter(x=df.index, y=df["ema_fast"], mode="lines", name=f"EMA {ema_fast}"))
-    fig.add_trace(go.Scatter(x=df.index, y=df["ema_slow"], mode="lines", name=f"EMA {ema_slow}"))
+    for span in (ema_fast, ema_slow):
+        ema = indicators().ema(series_key, cols, span)[lo:hi]
+        x, y = lod.downsample_line(view["timestamp"], ema, buckets)
+        fig.add_trace(go.Scatter(x=to_dt(x), y=y, mode="lines", name=f"EMA {span}"))
 
     if trades is not None and not trades.empty:
-        buys = trades[trades["side"].str.lower() == "buy"]
-        sells = trades[trades["side"].str.lower() == "sell"]
+        keep = lod.thin_markers(trades["ts"].to_numpy(), trades["side"].str.lower().to_numpy(),
+                                start_ms, end_ms, buckets)
+        shown = trades.iloc[keep]
+        buys = shown[shown["side"].str.lower() == "buy"]
+        sells = shown[shown["side"].str.lower() == "sell"]
         fig.add_trace(go.Scatter(x=buys["timestamp"], y=buys["price"], mode="markers", name="Buys",
                                  marker=dict(symbol="triangle-up", color="green", size=10)))
         fig.add_trace(go.Scatter(x=sells["timestamp"], y=sells["price"], mode="markers", name="Sells",
                                  marker=dict(symbol="triangle-down", color="red", size=10)))
 
-    fig.update_layout(xaxis_rangeslider_visible=False, template="plotly_dark", height=600)
+    fig.update_layout(xaxis_rangeslider_visible=False, template="plotly_dark", height=600,
+                      uirevision=str(series_key))
     return fig
 
 # --------------------------- CONFIG ---------------------------
@@ -105,6 +157,8 @@ def main():
 
     init_db()
     cfg = load_config()
+    if cfg.get("datastore", {}).get("enabled", True) and CANDLES.lake is None:
+        CANDLES.lake = OHLCVStore()
     products = fetch_products()
 
     # Sidebar Settings
@@ -123,22 +177,39 @@ def main():
         write_config(cfg)
         st.sidebar.success("Configuration saved!")
 
+    trades = read_trades(symbol=symbol)
+
     # Tabs
     tab1, tab2, tab3 = st.tabs(["📊 Chart", "📒 Trades", "🛠 Controls"])
 
     with tab1:
         try:
-            broker = Broker(exchange_id=cfg["exchange_id"], mode=cfg["mode"])
-            df = broker.fetch_ohlcv(symbol, timeframe, limit=200)
-            df["timestamp"] = pd.to_datetime(df["timestamp"], errors='coerce')
-            df = df.dropna(subset=["timestamp"]).set_index("timestamp")
-            trades = read_trades(symbol=symbol)
-            st.plotly_chart(plot_candles_ema(df, trades, ema_fast, ema_slow), use_container_width=True)
+            cols = chart_columns(cfg["exchange_id"], cfg["mode"], symbol, timeframe, cfg.get("rate_limit", {}))
+            first, last = pd.to_datetime([cols["timestamp"][0], cols["timestamp"][-1]], unit="ms", utc=True)
+            start, end = first, last
+            if first < last:
+                # Zooming re-reads only this window of the series, at full detail when it is short.
+                start, end = st.slider("Window", min_value=first.to_pydatetime(), max_value=last.to_pydatetime(),
+                                       value=(first.to_pydatetime(), last.to_pydatetime()))
+            start_ms = pd.Timestamp(start).value // 1_000_000
+            end_ms = pd.Timestamp(end).value // 1_000_000 + 1
+            series_key = (cfg["exchange_id"], symbol, timeframe)
+            st.plotly_chart(plot_candles_ema(cols, trades, ema_fast, ema_slow, series_key, start_ms, end_ms),
+                            use_container_width=True)
         except Exception as e:
             st.error(f"Chart loading failed: {e}")
 
     with tab2:
-        trades = read_trades(symbol=symbol)
+        equity = read_equity(since_ms=pd.Timestamp.now(tz="UTC").value // 1_000_000 - EQUITY_WINDOW_MS)
+        if not equity.empty:
+            latest = equity.iloc[-1]
+            c1, c2, c3, c4 = st.columns(4)
+            c1.metric("Equity", f"{latest['equity']:,.2f}")
+            c2.metric("Realized PnL", f"{latest['realized']:,.2f}", f"fees {latest['fees']:,.2f}", delta_color="off")
+            c3.metric("Unrealized PnL", f"{latest['unrealized']:,.2f}")
+            c4.metric("Drawdown", f"{latest['drawdown']:.2%}", f"today {latest['daily_drawdown']:.2%}", delta_color="off")
+            x, y = lod.downsample_line(equity["ts"].to_numpy(), equity["equity"].to_numpy(), CHART_BUCKETS)
+            st.line_chart(pd.Series(y, index=pd.to_datetime(x, unit="ms", utc=True), name="Equity"))
         if trades.empty:
             st.info("No trades found.")
         else:
@@ -149,7 +220,9 @@ def main():
 
         # Editable config form
         with st.form("bot_config_form"):
-            mode = st.selectbox("Mode", options=["paper", "live"], index=["paper", "live"].index(cfg.get("mode", "paper")))
+            current_mode = cfg.get("mode", "paper")
+            mode = st.selectbox("Mode", options=MODES,
+                                index=MODES.index(current_mode) if current_mode in MODES else 0)
             symbol_cfg = st.text_input("Symbol", value=cfg.get("symbol", "BTC/USDT"))
             trade_qty = st.number_input("Trade Quantity", min_value=0.0001, value=cfg.get("trade_qty", 0.001), format="%.6f")
 
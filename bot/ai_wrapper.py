@@ -1,40 +1,103 @@
 """
-Wraps trading logic with AI-based position and signal evaluation
+Wraps trading logic with AI-based position and signal evaluation.
+
+`compute_signals_batch` evaluates many symbols per tick: features for all
+of them are stacked into one (symbols, FEATURE_WINDOW, features) array
+and the model sees the whole batch in one `predict_batch` call (when it has
+one). Sentiment comes from a SentimentService (bot.sentiment) that
+refreshes scores in the background, so the vote reads them from memory;
+only symbols never scored before are fetched (concurrently) on the spot.
+
+With `inference_socket` the model runs in a shared inference server
+(bot.inference) instead of being loaded into this process.
 """
-from ai_engine.model import AIModel
+import numpy as np
+
 from ai_engine.sentiment import SentimentAnalyzer
 from ai_engine.features import FeatureBuilder
+from bot.sentiment import SentimentService
+
+FEATURE_COLUMNS = ("close", "ema_fast", "ema_slow")
+FEATURE_WINDOW = 64
+SENTIMENT_TTL = 300.0
+SENTIMENT_WAIT = 5.0
+
+
+def vote(ema_signal, ai_signal, sentiment_score):
+    """Triple vote: two of three agreeing decides."""
+    total = ema_signal + ai_signal + sentiment_score
+    if total >= 2:
+        return "buy"
+    elif total <= -2:
+        return "sell"
+    return "hold"
+
+
+def stack_features(frames, columns=FEATURE_COLUMNS, window=FEATURE_WINDOW):
+    """
+    (len(frames), window, len(columns)) float array of each frame's last
+    `window` rows; shorter frames are padded with their first row.
+    """
+    out = np.empty((len(frames), window, len(columns)))
+    for i, df in enumerate(frames):
+        values = df[list(columns)].to_numpy(dtype="float64")[-window:]
+        out[i, window - len(values):] = values
+        out[i, :window - len(values)] = values[0]
+    return out
+
 
 class SmartAIBot:
 
-    def __init__(self):
-        self.model = AIModel()
+    def __init__(self, sentiment_ttl=SENTIMENT_TTL, sentiment_workers=8, inference_socket=None):
+        if inference_socket:
+            # Share the warm model of an inference server (bot.inference).
+            from bot.inference import InferenceClient
+            self.model = InferenceClient(inference_socket)
+        else:
+            from ai_engine.model import AIModel
+            self.model = AIModel()
         self.sentiment = SentimentAnalyzer()
         self.features = FeatureBuilder()
+        self.scores = SentimentService(self.sentiment.score, ttl=sentiment_ttl, workers=sentiment_workers).start()
 
     def compute_signals(self, price_df, symbol):
         """
         Returns an AI-enhanced buy/sell/hold signal.
         """
+        return self.compute_signals_batch({symbol: price_df})[symbol]
 
-        # Traditional EMA Logic
-        price_df = self.features.add_ema(price_df)
-        last = price_df.iloc[-1]
-        prev = price_df.iloc[-2]
+    def close(self):
+        self.scores.stop()
+        close = getattr(self.model, "close", None)
+        if close is not None:
+            close()
 
-        ema_signal = 1 if last["ema_fast"] > last["ema_slow"] else -1
+    # -------- model --------
+    def _predict(self, frames, features):
+        batch = getattr(self.model, "predict_batch", None)
+        if batch is not None:
+            return np.asarray(batch(features)).reshape(-1)
+        return np.array([self.model.predict(df) for df in frames])
 
-        # AI Prediction
-        ai_signal = self.model.predict(price_df)
-
-        # News Sentiment
-        sentiment_score = self.sentiment.score(symbol)
+    def compute_signals_batch(self, price_dfs):
+        """
+        Signals for {symbol: price_df}; returns {symbol: "buy"|"sell"|"hold"}.
+        Symbols without any candles get "hold".
+        """
+        signals = {s: "hold" for s, df in price_dfs.items() if df is None or df.empty}
+        symbols = [s for s in price_dfs if s not in signals]
+        if not symbols:
+            return signals
+        self.scores.track(symbols)
+        self.scores.ensure(symbols, timeout=SENTIMENT_WAIT)
 
-        # TRIPLE VOTE SYSTEM
-        total = ema_signal + ai_signal + sentiment_score
+        frames = [self.features.add_ema(price_dfs[s]) for s in symbols]
+        features = stack_features(frames)
+        ema_signals = np.where(features[:, -1, 1] > features[:, -1, 2], 1, -1)
+        ai_signals = self._predict(frames, features)
 
-        if total >= 2:
-            return "buy"
-        elif total <= -2:
-            return "sell"
-        return "hold"
+        scores = self.scores.scores(symbols)
+        # The model's raw output votes as is, as it did before batching.
+        signals.update({s: vote(int(ema_signals[i]), float(ai_signals[i]), scores[s])
+                        for i, s in enumerate(symbols)})
+        return {s: signals[s] for s in price_dfs}
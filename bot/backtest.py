@@ -0,0 +1,201 @@
+"""
+Vectorized backtest of the EMA-crossover + RSI strategy run by
+bot.runtime.SymbolTrader.
+
+Signals for the whole history are computed with NumPy/pandas in one pass;
+the fill simulator then jumps from entry to exit with vectorized searches
+instead of stepping bar by bar. Entry/exit rules mirror the live loop,
+evaluated on each bar's close:
+
+- with a position: stop-loss, then take-profit, then the reverse-signal
+  exit; after a stop-loss/take-profit the same bar is re-checked for an
+  entry, as the live loop re-runs immediately after those exits;
+- without a position: buy when EMA fast crosses above slow and RSI is
+  below `rsi_buy`.
+
+Trades come back as a DataFrame with the journal's trade columns; a
+sell's `pnl` is qty-scaled and net of both fills' fees, as bot.portfolio
+books it live.
+"""
+from collections import namedtuple
+import numpy as np
+import pandas as pd
+
+from bot.indicators import ema_series, rsi_series
+from bot.journal import TRADE_COLUMNS
+
+BacktestResult = namedtuple("BacktestResult", "trades equity stats")
+
+SECONDS_PER_YEAR = 365 * 24 * 3600
+
+
+def signals_from(ema_fast, ema_slow, rsi, rsi_buy=30, rsi_sell=70):
+    """Boolean entry/exit arrays from precomputed indicator series."""
+    signal = (ema_fast > ema_slow).astype(np.int8)
+    prev = np.empty_like(signal)
+    prev[0] = -1
+    prev[1:] = signal[:-1]
+    with np.errstate(invalid="ignore"):
+        entry = (prev == 0) & (signal == 1) & (rsi < rsi_buy)
+        exit_ = (prev == 1) & (signal == 0) & (rsi > rsi_sell)
+    return entry, exit_
+
+
+def strategy_signals(close, fast=12, slow=26, rsi_period=14, rsi_buy=30, rsi_sell=70):
+    """Boolean entry/exit arrays, one element per bar."""
+    return signals_from(ema_series(close, fast), ema_series(close, slow),
+                        rsi_series(close, rsi_period), rsi_buy, rsi_sell)
+
+
+def _find_exit(close, exit_signal, start, stop_price, target_price, chunk=4096):
+    n = len(close)
+    while start < n:
+        end = min(n, start + chunk)
+        seg = close[start:end]
+        hit = (seg <= stop_price) | (seg >= target_price) | exit_signal[start:end]
+        if hit.any():
+            j = start + int(hit.argmax())
+            if close[j] <= stop_price:
+                return j, "stop_loss"
+            if close[j] >= target_price:
+                return j, "take_profit"
+            return j, "signal"
+        start, chunk = end, chunk * 2
+    return None, None
+
+
+def simulate(close, entry, exit_signal, stop_loss, take_profit):
+    """
+    Walk entries and exits; returns a list of (entry_idx, exit_idx, reason).
+    A position still open at the end has exit_idx None.
+    """
+    entries = np.flatnonzero(entry)
+    fills = []
+    k = 0
+    while True:
+        pos = np.searchsorted(entries, k)
+        if pos >= len(entries):
+            break
+        i = int(entries[pos])
+        entry_price = close[i]
+        j, reason = _find_exit(close, exit_signal, i + 1,
+                               entry_price * (1 - stop_loss), entry_price * (1 + take_profit))
+        fills.append((i, j, reason))
+        if j is None:
+            break
+        k = j if reason in ("stop_loss", "take_profit") else j + 1
+    return fills
+
+
+def _periods_per_year(ts_ms):
+    if len(ts_ms) < 2:
+        return 0.0
+    step = float(np.median(np.diff(ts_ms))) / 1000.0
+    return SECONDS_PER_YEAR / step if step > 0 else 0.0
+
+
+def _equity(close, fills, qty, fee_rate, slippage):
+    """Mark-to-market equity per bar (quote currency) including fill costs."""
+    n = len(close)
+    held = np.zeros(n + 1)
+    costs = np.zeros(n)
+    for i, j, _ in fills:
+        held[i + 1] += 1
+        # Fees are charged on the slipped fill price, as in the trades frame.
+        costs[i] += close[i] * qty * (slippage + (1 + slippage) * fee_rate)
+        if j is not None:
+            held[j + 1] -= 1
+            costs[j] += close[j] * qty * (slippage + (1 - slippage) * fee_rate)
+    held = np.cumsum(held[:n])
+    bar_pnl = np.diff(close, prepend=close[0]) * held * qty - costs
+    return np.cumsum(bar_pnl), bar_pnl
+
+
+def _round_trip_pnl(buy_price, sell_price, qty, fee_rate):
+    """Net PnL of a closed round trip: qty-scaled, less the fees of both fills."""
+    return (sell_price - buy_price) * qty - (buy_price + sell_price) * qty * fee_rate
+
+
+def _trades_frame(ts_ms, close, fills, symbol, qty, fee_rate, slippage):
+    rows = []
+    for i, j, _ in fills:
+        buy_price = close[i] * (1 + slippage)
+        rows.append((int(ts_ms[i]), "buy", buy_price, 0.0))
+        if j is not None:
+            sell_price = close[j] * (1 - slippage)
+            rows.append((int(ts_ms[j]), "sell", sell_price, _round_trip_pnl(buy_price, sell_price, qty, fee_rate)))
+    df = pd.DataFrame(rows, columns=["ts", "side", "price", "pnl"])
+    df["timestamp"] = pd.to_datetime(df["ts"], unit="ms", utc=True).map(lambda t: t.isoformat())
+    df["symbol"] = symbol
+    df["qty"] = float(qty)
+    df["fee"] = df["price"] * qty * fee_rate
+    df["order_id"] = None
+    return df[list(TRADE_COLUMNS)]
+
+
+def to_epoch_ms(ts):
+    """Epoch-ms int64 array from a datetime or integer timestamp column."""
+    if pd.api.types.is_datetime64_any_dtype(ts):
+        if ts.dt.tz is not None:
+            ts = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+        return ts.to_numpy("datetime64[ms]").astype("int64")
+    return ts.to_numpy(dtype="int64")
+
+
+def evaluate(ts_ms, close, risk, qty=0.001, fee_rate=0.0, slippage=0.0, signals=None, rsi_period=14):
+    """
+    Core backtest over arrays; returns (fills, equity, stats). `signals`
+    may carry precomputed (entry, exit) arrays.
+    """
+    if signals is None:
+        signals = strategy_signals(
+            close, fast=risk["fast"], slow=risk["slow"], rsi_period=rsi_period,
+            rsi_buy=risk.get("rsi_buy", 30), rsi_sell=risk.get("rsi_sell", 70))
+    entry, exit_signal = signals
+    fills = simulate(close, entry, exit_signal, risk["stop_loss"], risk["take_profit"])
+    equity, bar_pnl = _equity(close, fills, qty, fee_rate, slippage)
+
+    closed = [f for f in fills if f[1] is not None]
+    realized = [_round_trip_pnl(close[i] * (1 + slippage), close[j] * (1 - slippage), qty, fee_rate)
+                for i, j, _ in closed]
+    std = bar_pnl.std()
+    drawdown = np.maximum.accumulate(equity) - equity if len(equity) else np.zeros(0)
+    stats = {
+        "bars": len(close),
+        "trades": len(closed),
+        "wins": sum(1 for p in realized if p > 0),
+        "stop_losses": sum(1 for f in closed if f[2] == "stop_loss"),
+        "take_profits": sum(1 for f in closed if f[2] == "take_profit"),
+        "net_pnl": float(equity[-1]) if len(equity) else 0.0,
+        "sharpe": float(bar_pnl.mean() / std * np.sqrt(_periods_per_year(ts_ms))) if std > 0 else 0.0,
+        "max_drawdown": float(drawdown.max()) if len(drawdown) else 0.0,
+    }
+    return fills, equity, stats
+
+
+def run_backtest(df, risk, symbol="BTC/USDT", qty=0.001, fee_rate=0.0, slippage=0.0, rsi_period=14):
+    """
+    Backtest over an OHLCV frame (timestamp as datetime or epoch ms, close)
+    using the `risk` config section: fast, slow, stop_loss, take_profit and
+    optional rsi_buy / rsi_sell.
+    """
+    close = df["close"].to_numpy(dtype="float64")
+    ts_ms = to_epoch_ms(df["timestamp"])
+    fills, equity, stats = evaluate(ts_ms, close, risk, qty=qty, fee_rate=fee_rate,
+                                    slippage=slippage, rsi_period=rsi_period)
+    trades = _trades_frame(ts_ms, close, fills, symbol, qty, fee_rate, slippage)
+    return BacktestResult(trades, pd.Series(equity, index=pd.to_datetime(ts_ms, unit="ms", utc=True)), stats)
+
+
+if __name__ == "__main__":
+    import sys
+    from bot.config_loader import load_config
+    from bot.datastore import read_candles
+
+    if len(sys.argv) < 2:
+        sys.exit("usage: python -m bot.backtest OHLCV.csv|SYMBOL [config.yaml]")
+    cfg = load_config(sys.argv[2] if len(sys.argv) > 2 else None)
+    candles = read_candles(sys.argv[1], cfg["exchange_id"], cfg["timeframe"])
+    result = run_backtest(candles, cfg["risk"], symbol=cfg["symbol"], qty=cfg["trade_qty"])
+    for k, v in result.stats.items():
+        print(f"{k:>14}: {v}")
@@ -4,9 +4,11 @@ import sqlite3
 import logging
 from pathlib import Path
 import pandas as pd
+from bot import journal
 from bot.broker import Broker
 from bot.config_loader import load_config
-from bot.notifications import notify_email, notify_telegram
+from bot.indicators import SignalEngine
+from bot.notifications import notify_email, notify_telegram, shutdown
 
 STORAGE = Path(__file__).resolve().parents[1] / "storage"
 DB_PATH = STORAGE / "journal.db"
@@ -17,28 +19,13 @@ STORAGE.mkdir(parents=True, exist_ok=True)
 logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
 
 def init_db():
-    with sqlite3.connect(DB_PATH) as con:
-        con.execute("""CREATE TABLE IF NOT EXISTS trades (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                timestamp TEXT,
-                symbol TEXT,
-                side TEXT,
-                price REAL,
-                qty REAL,
-                fee REAL,
-                pnl REAL
-            )""")
-
-def ema_crossover(df, fast=12, slow=26):
-    df["ema_fast"] = df["close"].ewm(span=fast).mean()
-    df["ema_slow"] = df["close"].ewm(span=slow).mean()
-    df["signal"] = (df["ema_fast"] > df["ema_slow"]).astype(int)
-    return df
+    journal.init_db(DB_PATH)
 
 def run_bot():
     last_mtime = None
     cfg = load_config(CONFIG_PATH)
     broker = Broker(exchange_id=cfg.get("exchange_id"), mode=cfg.get("mode"))
+    engine = SignalEngine()
     position = None
 
     init_db()
@@ -51,6 +38,7 @@ def run_bot():
             if last_mtime is None or mtime > last_mtime:
                 cfg = load_config(CONFIG_PATH)
                 broker = Broker(exchange_id=cfg.get("exchange_id"), mode=cfg.get("mode"))
+                engine = SignalEngine()
                 logging.info("Config reloaded")
                 last_mtime = mtime
         except Exception as e:
@@ -60,12 +48,12 @@ def run_bot():
             logging.info("Kill flag detected. Exiting.")
             notify_email("Bot Stopped", "Kill flag triggered")
             notify_telegram("Bot stopped")
+            shutdown()
             break
 
         try:
             df = broker.fetch_ohlcv(cfg.get("symbol"), cfg.get("timeframe"), limit=200)
-            df = ema_crossover(df)
-            last, prev = df.iloc[-1], df.iloc[-2]
+            last, prev = engine.feed(df)
 
             with sqlite3.connect(DB_PATH) as con:
                 if prev["signal"] == 0 and last["signal"] == 1 and position is None:
@@ -1,81 +1,305 @@
-import os
+import time
 import random
-from datetime import datetime, timezone
+import logging
+import threading
+import numpy as np
 import pandas as pd
 
-try:
-    import ccxt
-except ImportError:
-    ccxt = None
+from bot import exchanges, metrics
+from bot.journal import iso_timestamp
+from bot.execution import OrderError, OrderExecutor, order_fee, retryable
+from bot.simulator import sim_exchange
+
+OHLCV_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+
+
+class CandleStore:
+    """
+    Keeps OHLCV history per (exchange, symbol, timeframe) and refreshes it
+    incrementally: only bars from the last (still open) one onwards are
+    requested via ccxt's `since`, and the open bar is replaced in place.
+
+    With a `lake` (bot.datastore.OHLCVStore) attached, an empty cache is
+    warmed from the local store and newly closed bars are appended to it.
+    """
+
+    def __init__(self, max_bars=1000, lake=None):
+        self.max_bars = max_bars
+        self.lake = lake
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def _seed(self, key, limit):
+        cols = self.lake.series(*key).columns()
+        keep = max(self.max_bars, limit)
+        data = np.column_stack([cols[c][-keep:] for c in OHLCV_COLUMNS]) if len(cols["timestamp"]) else []
+        rows = [[int(r[0]), *map(float, r[1:])] for r in data]
+        with self._lock:
+            self._series.setdefault(key, rows)
+        return rows
+
+    def _persist(self, key, rows):
+        """Append closed bars (all but the open one) the lake does not have yet."""
+        try:
+            series = self.lake.series(*key)
+            last = series.last_ts()
+            closed = [r for r in rows[:-1] if last is None or r[0] > last]
+            if closed:
+                series.merge(closed)
+        except Exception as e:
+            logging.error(f"Candle store write failed for {key}: {e}")
+
+    def _since(self, exchange, key, timeframe, limit):
+        """Timestamp to fetch from, or None when a full fetch is needed."""
+        with self._lock:
+            rows = self._series.get(key)
+        if not rows and self.lake is not None:
+            rows = self._seed(key, limit)
+        if not rows or len(rows) < limit:
+            return None
+        # After a long pause the gap may exceed one page of `since` results.
+        bar_ms = exchange.parse_timeframe(timeframe) * 1000
+        if exchange.milliseconds() - rows[-1][0] > bar_ms * limit:
+            return None
+        return rows[-1][0]
+
+    def _store(self, key, fresh, since, limit):
+        with self._lock:
+            rows = fresh
+            if since is not None:
+                rows = self._series.get(key, [])
+                if fresh:
+                    first_ts = fresh[0][0]
+                    rows = [r for r in rows if r[0] < first_ts] + fresh
+            rows = rows[-max(self.max_bars, limit):]
+            self._series[key] = rows
+        if self.lake is not None:
+            self._persist(key, rows)
+        return rows[-limit:]
+
+    def update(self, exchange, symbol, timeframe, limit=200):
+        key = (exchange.id, symbol, timeframe)
+        since = self._since(exchange, key, timeframe, limit)
+        metrics.API_CALLS.labels("fetch_ohlcv").inc()
+        if since is None:
+            fresh = exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+        else:
+            fresh = exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since)
+        return self._store(key, fresh, since, limit)
+
+    async def aupdate(self, exchange, symbol, timeframe, limit=200):
+        key = (exchange.id, symbol, timeframe)
+        since = self._since(exchange, key, timeframe, limit)
+        metrics.API_CALLS.labels("fetch_ohlcv").inc()
+        if since is None:
+            fresh = await exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
+        else:
+            fresh = await exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=since)
+        return self._store(key, fresh, since, limit)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+
+# Shared by every Broker so history survives config reloads.
+CANDLES = CandleStore()
+
 
 class Broker:
-    def __init__(self, exchange_id="coinbasepro", mode="paper"):
+    """
+    Live clients come from the shared pool in bot.exchanges, so building a
+    Broker per reload or dashboard rerun is cheap; `limiter` paces every
+    request the pooled client makes.
+    """
+
+    def __init__(self, exchange_id="coinbasepro", mode="paper", candles=None, limiter=None):
         self.mode = mode.lower()
         self.exchange = None
+        self.candles = candles or CANDLES
         if self.mode == "live":
-            if not ccxt:
-                raise RuntimeError("ccxt is required for live mode.")
-            api_key = os.getenv("EXCHANGE_API_KEY")
-            api_secret = os.getenv("EXCHANGE_API_SECRET")
-            if not api_key or not api_secret:
-                raise RuntimeError("Missing API keys for live trading.")
-            exchange_cls = getattr(ccxt, exchange_id)
-            self.exchange = exchange_cls({
-                "apiKey": api_key,
-                "secret": api_secret,
-                "enableRateLimit": True,
-            })
+            self.exchange = exchanges.client(exchange_id, limiter=limiter)
+
+    @staticmethod
+    def _paper_ohlcv(limit):
+        prices = 30000 + np.random.normal(0, 200, limit)
+        ts = pd.date_range(end=pd.Timestamp.utcnow(), periods=limit, freq="h")
+        return pd.DataFrame({
+            "timestamp": ts,
+            "open": prices,
+            "high": prices * (1 + np.random.uniform(0, 0.01, limit)),
+            "low": prices * (1 - np.random.uniform(0, 0.01, limit)),
+            "close": prices * (1 + np.random.uniform(-0.005, 0.005, limit)),
+            "volume": np.random.uniform(1, 10, limit)
+        })
+
+    @staticmethod
+    def _to_frame(data):
+        df = pd.DataFrame(data, columns=OHLCV_COLUMNS)
+        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True)
+        return df
+
+    @staticmethod
+    def _fill(symbol, side, qty, price, fee=0.0, order_id=None):
+        ts = int(time.time() * 1000)
+        return {
+            "timestamp": iso_timestamp(ts),
+            "ts": ts,
+            "symbol": symbol,
+            "side": side,
+            "price": float(price),
+            "qty": float(qty),
+            "fee": float(fee),
+            "pnl": 0.0,
+            "order_id": order_id
+        }
+
+    @staticmethod
+    def _paper_price(price):
+        return price if price else 30000 + random.uniform(-200, 200)
+
+    @staticmethod
+    def _ticker(ticker):
+        last = ticker.get("last") or ticker.get("close")
+        return {
+            "timestamp": ticker.get("timestamp"),
+            "bid": ticker.get("bid") or last,
+            "ask": ticker.get("ask") or last,
+            "last": last,
+        }
+
+    def _paper_ticker(self):
+        price = self._paper_price(None)
+        return {"timestamp": int(time.time() * 1000), "bid": price, "ask": price, "last": price}
 
     def fetch_ohlcv(self, symbol="BTC/USDT", timeframe="1h", limit=200):
         if self.mode == "paper":
-            prices = [30000 + random.gauss(0, 200) for _ in range(limit)]
-            ts = pd.date_range(end=pd.Timestamp.utcnow(), periods=limit, freq="h")
-            df = pd.DataFrame({
-                "timestamp": ts,
-                "open": prices,
-                "high": [p * (1 + random.uniform(0, 0.01)) for p in prices],
-                "low": [p * (1 - random.uniform(0, 0.01)) for p in prices],
-                "close": [p * (1 + random.uniform(-0.005, 0.005)) for p in prices],
-                "volume": [random.uniform(1, 10) for _ in prices]
-            })
-            return df
+            return self._paper_ohlcv(limit)
         else:
             try:
-                data = self.exchange.fetch_ohlcv(symbol, timeframe=timeframe, limit=limit)
-                df = pd.DataFrame(data, columns=["timestamp","open","high","low","close","volume"])
-                df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True)
-                return df
+                data = self.candles.update(self.exchange, symbol, timeframe, limit=limit)
+                return self._to_frame(data)
             except Exception as e:
                 print(f"Error fetching OHLCV: {e}")
                 return pd.DataFrame()
 
+    def fetch_ticker(self, symbol="BTC/USDT"):
+        """Best bid/ask and last price; None when the request fails."""
+        if self.mode == "paper":
+            return self._paper_ticker()
+        try:
+            return self._ticker(self.exchange.fetch_ticker(symbol))
+        except Exception as e:
+            print(f"Error fetching ticker: {e}")
+            return None
+
     def place_order(self, symbol, side, qty, price=None):
-        ts = datetime.now(timezone.utc).isoformat()
         if self.mode == "paper":
-            executed = float(price if price else 30000 + random.uniform(-200, 200))
-            fee = 0.0
-            return {
-                "timestamp": ts,
-                "symbol": symbol,
-                "side": side,
-                "price": executed,
-                "qty": float(qty),
-                "fee": fee,
-                "pnl": 0.0
-            }
+            return self._fill(symbol, side, qty, self._paper_price(price))
         else:
             try:
                 order = self.exchange.create_market_order(symbol, side, qty)
-                filled_price = float(price if price else order.get("average") or order.get("price"))
-                return {
-                    "timestamp": ts,
-                    "symbol": symbol,
-                    "side": side,
-                    "price": filled_price,
-                    "qty": float(qty),
-                    "fee": 0.0,
-                    "pnl": 0.0
-                }
+                filled_price = float(order.get("average") or order.get("price") or price)
+                return self._fill(symbol, side, order.get("filled") or qty, filled_price,
+                                  fee=order_fee(order, filled_price), order_id=order.get("id"))
             except Exception as e:
                 print(f"Error placing order: {e}")
                 return None
+
+
+class AsyncBroker(Broker):
+    """
+    Broker backed by ccxt.async_support. All calls go through one shared
+    limiter (bot.exchanges.limiter_for by default) so many symbol tasks can
+    use the same instance.
+
+    With a `stream` (bot.stream.MarketStream) attached, candles for the
+    symbols it carries come from the stream without any REST call.
+
+    Orders outside paper mode go through an OrderExecutor (bot.execution).
+    A ready exchange object, e.g. bot.fake_exchange.FakeExchange, can be
+    passed as `exchange` in place of a ccxt client. Mode "sim" trades
+    against a bot.simulator.SimExchange built from the `sim` settings.
+
+    `on_unresolved(order)` is called with an order that failed but may
+    still be live or filled on the exchange (see bot.execution.OrderError).
+    """
+
+    def __init__(self, exchange_id="coinbasepro", mode="paper", candles=None, limiter=None, stream=None,
+                 exchange=None, execution=None, sim=None, on_unresolved=None):
+        self.mode = mode.lower()
+        self.exchange = exchange
+        if self.mode == "sim" and self.exchange is None:
+            self.exchange = sim_exchange(sim)
+        # Simulated bars must not end up in the shared cache or the candle lake.
+        self.candles = candles or (CandleStore() if self.mode == "sim" else CANDLES)
+        self.limiter = limiter or exchanges.limiter_for({"exchange_id": exchange_id, "mode": self.mode})
+        self.stream = stream
+        self.on_unresolved = on_unresolved
+        if self.mode == "live" and self.exchange is None:
+            self.exchange = exchanges.client(exchange_id, asynchronous=True)
+        self.executor = None
+        if self.exchange is not None:
+            self.executor = OrderExecutor(self.exchange, self.limiter, **(execution or {}))
+
+    async def _markets(self):
+        if self.exchange is not None and exchanges.pooled(self.exchange) and not self.exchange.markets:
+            await self.limiter.acquire()
+            metrics.API_CALLS.labels("load_markets").inc()
+            await exchanges.load_markets(self.exchange)
+
+    async def fetch_ohlcv(self, symbol="BTC/USDT", timeframe="1h", limit=200):
+        if self.stream is not None and symbol in self.stream.builders:
+            return self._to_frame(self.stream.candles(symbol, limit))
+        await self.limiter.acquire()
+        if self.mode == "paper":
+            return self._paper_ohlcv(limit)
+        try:
+            await self._markets()
+            data = await self.candles.aupdate(self.exchange, symbol, timeframe, limit=limit)
+            return self._to_frame(data)
+        except Exception as e:
+            print(f"Error fetching OHLCV: {e}")
+            metrics.ERRORS.labels("api").inc()
+            return pd.DataFrame()
+
+    async def fetch_ticker(self, symbol="BTC/USDT"):
+        if self.stream is not None and symbol in self.stream.last_price:
+            price = self.stream.last_price[symbol]
+            return {"timestamp": int(time.time() * 1000), "bid": price, "ask": price, "last": price}
+        await self.limiter.acquire()
+        if self.mode == "paper":
+            return self._paper_ticker()
+        try:
+            await self._markets()
+            metrics.API_CALLS.labels("fetch_ticker").inc()
+            return self._ticker(await self.exchange.fetch_ticker(symbol))
+        except Exception as e:
+            print(f"Error fetching ticker: {e}")
+            metrics.ERRORS.labels("api").inc()
+            return None
+
+    async def place_order(self, symbol, side, qty, price=None):
+        """Fill dict, or None when the order failed after retries."""
+        if self.executor is None:
+            await self.limiter.acquire()
+            return self._fill(symbol, side, qty, self._paper_price(price))
+        try:
+            await self._markets()
+            r = await self.executor.execute(symbol, side, qty, ref_price=price)
+        except (OrderError, *retryable()) as e:
+            print(f"Error placing order: {e}")
+            metrics.ERRORS.labels("order").inc()
+            if getattr(e, "unresolved", False) and self.on_unresolved is not None:
+                self.on_unresolved({
+                    "ts": int(time.time() * 1000), "symbol": symbol, "side": side, "qty": float(qty),
+                    "order_id": e.order_id, "client_order_id": e.client_id,
+                    "status": (e.order or {}).get("status", "unknown"), "error": str(e),
+                })
+            return None
+        return self._fill(symbol, side, r["filled"], r["price"], fee=r["fee"], order_id=r["order_id"])
+
+    async def close(self):
+        # Pooled clients outlive brokers; bot.exchanges.close_all() closes them.
+        if self.exchange is not None and not exchanges.pooled(self.exchange):
+            await self.exchange.close()
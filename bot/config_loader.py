@@ -1,4 +1,10 @@
 import os
+import select
+import logging
+import threading
+import ctypes
+import ctypes.util
+from collections.abc import Mapping
 import yaml
 from pathlib import Path
 
@@ -6,6 +12,7 @@ DEFAULT_CONFIG = {
     "mode": "paper",
     "exchange_id": "coinbasepro",
     "symbol": "BTC/USDT",
+    "symbols": [],
     "timeframe": "1h",
     "trade_qty": 0.001,
     "risk": {
@@ -13,13 +20,66 @@ DEFAULT_CONFIG = {
         "slow": 26,
         "risk_per_trade": 0.005,
         "stop_loss": 0.02,
-        "take_profit": 0.04
+        "take_profit": 0.04,
+        "rsi_buy": 30,
+        "rsi_sell": 70
+    },
+    "rate_limit": {
+        "per_second": 5,
+        "burst": 10,
+        "shared": True
+    },
+    "journal": {
+        "batch_size": 100,
+        "flush_interval": 0.05,
+        "synchronous": "NORMAL",
+        "checkpoint_interval": 30
+    },
+    "datastore": {
+        "enabled": True
+    },
+    "execution": {
+        "max_retries": 3,
+        "backoff": 0.5,
+        "fill_timeout": 30.0,
+        "poll_interval": 0.5,
+        "max_inflight": 4
+    },
+    "sim": {
+        "model": "gbm",
+        "sigma": 0.8,
+        "tick_ms": 1000,
+        "spread_bps": 2.0,
+        "impact_bps": 5.0,
+        "ack_ms": 40.0,
+        "fill_ms": 60.0,
+        "fee_rate": 0.001,
+        "seed": 42
+    },
+    "guardian": {
+        "interval": 1.0,
+        "latency_budget_ms": 250
+    },
+    "market_data": {
+        "mode": "poll",
+        "source": "replay",
+        "host": "127.0.0.1",
+        "port": 8765
     },
     "limits": {
         "max_daily_dd": 0.02,
         "max_session_dd": 0.05,
         "max_open_trades": 1
     },
+    "portfolio": {
+        "starting_equity": 10000.0,
+        "snapshot_interval": 60
+    },
+    "metrics": {
+        "enabled": True,
+        "host": "127.0.0.1",
+        "port": 9108
+    },
     "auto": {
         "enabled": False,
         "interval_min": 60,
@@ -79,3 +139,234 @@ def load_config(config_path: str = None):
         return out
 
     return merge(DEFAULT_CONFIG, {**cfg, **env})
+
+
+# -------- process-wide config service --------
+def _freeze(value):
+    if isinstance(value, Mapping):
+        return ConfigSnapshot(value)
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, ConfigSnapshot):
+        return value.to_dict()
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+class ConfigSnapshot(Mapping):
+    """Immutable view of a merged config; nested sections are snapshots too."""
+
+    __slots__ = ("_data",)
+
+    def __init__(self, data):
+        self._data = {k: _freeze(v) for k, v in data.items()}
+
+    def __getitem__(self, key):
+        return self._data[key]
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def __len__(self):
+        return len(self._data)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+    def lookup(self, dotted, default=None):
+        node = self
+        for part in dotted.split("."):
+            if not isinstance(node, Mapping) or part not in node:
+                return default
+            node = node[part]
+        return node
+
+    def to_dict(self):
+        return {k: _thaw(v) for k, v in self._data.items()}
+
+
+class _Inotify:
+    """Minimal ctypes inotify watch on a directory (Linux only)."""
+
+    MASK = 0x00000002 | 0x00000008 | 0x00000080 | 0x00000100  # MODIFY | CLOSE_WRITE | MOVED_TO | CREATE
+
+    def __init__(self, directory):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self.fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(self.fd, os.fsencode(str(directory)), self.MASK) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, f"inotify_add_watch failed for {directory}")
+
+    def wait(self, timeout):
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+def watch_path(path, callback, stop, poll_interval=1.0):
+    """
+    Call `callback()` once `path` exists, from a daemon thread; watches the
+    parent directory with inotify where available, polls otherwise. Set the
+    `stop` threading.Event to end the watch. Returns the thread.
+    """
+    path = Path(path)
+
+    def _run():
+        try:
+            notifier = _Inotify(path.parent)
+        except (OSError, AttributeError):
+            notifier = None
+        try:
+            while not stop.is_set():
+                if path.exists():
+                    callback()
+                    return
+                if notifier is not None:
+                    notifier.wait(poll_interval)
+                else:
+                    stop.wait(poll_interval)
+        finally:
+            if notifier is not None:
+                notifier.close()
+
+    thread = threading.Thread(target=_run, name=f"watch:{path.name}", daemon=True)
+    thread.start()
+    return thread
+
+
+class ConfigService:
+    """
+    Parses config.yaml once and publishes an immutable `snapshot`. A watcher
+    thread (inotify where available, stat polling otherwise) swaps in a new
+    snapshot when the file changes and calls subscribers whose keys differ.
+    """
+
+    def __init__(self, config_path=None, poll_interval=1.0):
+        if config_path is None:
+            config_path = Path(__file__).resolve().parents[1] / "config" / "config.yaml"
+        self.config_path = Path(config_path).resolve()
+        self.poll_interval = poll_interval
+        self.version = 1
+        self.snapshot = ConfigSnapshot(load_config(self.config_path))
+        self._signature = self._stat()
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def subscribe(self, callback, keys=None):
+        """
+        Call `callback(old, new)` after a reload that changes any of `keys`
+        (dotted paths such as "risk.fast"); with no keys, on any change.
+        """
+        with self._lock:
+            self._subscribers.append((callback, tuple(keys) if keys else None))
+        return callback
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s[0] is not callback]
+
+    def _stat(self):
+        try:
+            st = os.stat(self.config_path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def reload(self):
+        try:
+            new = ConfigSnapshot(load_config(self.config_path))
+        except Exception as e:
+            logging.error(f"Config reload error: {e}")
+            return False
+        old = self.snapshot
+        if new == old:
+            return False
+        self.snapshot = new
+        self.version += 1
+        logging.info("Config reloaded")
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback, keys in subscribers:
+            if keys is None or any(old.lookup(k) != new.lookup(k) for k in keys):
+                try:
+                    callback(old, new)
+                except Exception as e:
+                    logging.error(f"Config subscriber failed: {e}")
+        return True
+
+    def check(self):
+        signature = self._stat()
+        if signature != self._signature:
+            self._signature = signature
+            return self.reload()
+        return False
+
+    def _watch(self):
+        try:
+            notifier = _Inotify(self.config_path.parent)
+        except (OSError, AttributeError):
+            notifier = None
+        try:
+            while not self._stop.is_set():
+                if notifier is not None:
+                    notifier.wait(self.poll_interval)
+                else:
+                    self._stop.wait(self.poll_interval)
+                self.check()
+        finally:
+            if notifier is not None:
+                notifier.close()
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._watch, name="config-watch", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+
+
+_SERVICES = {}
+_SERVICES_LOCK = threading.Lock()
+
+
+def config_service(config_path=None):
+    """Shared, started ConfigService for `config_path` (default config.yaml)."""
+    if config_path is None:
+        config_path = Path(__file__).resolve().parents[1] / "config" / "config.yaml"
+    key = Path(config_path).resolve()
+    with _SERVICES_LOCK:
+        service = _SERVICES.get(key)
+        if service is None:
+            service = _SERVICES[key] = ConfigService(key)
+    return service.start()
+
+
+def current_config():
+    return config_service().snapshot
@@ -0,0 +1,267 @@
+"""
+Local OHLCV store under storage/candles.
+
+Each (exchange, symbol, timeframe) series is a directory holding one
+raw little-endian column file per field (timestamp.i8, open.f8, ...).
+New closed bars are appended in place; reads memory-map the columns and
+slice them by time with a binary search, so ranges come back as
+zero-copy views. Only closed bars are stored; the open bar stays with
+the live CandleStore.
+
+The column files live in a generation subdirectory (v1, v2, ...) named
+by the series' CURRENT manifest, and readers resolve them through it.
+A sorted rewrite writes every column into the next generation and then
+swaps the manifest with one rename, so a crash or a concurrent reader
+sees either the old set of columns or the new one, never a mix. The
+previous generation is kept until the one after, for readers that
+resolved the manifest just before the switch. A series without a
+manifest (the older flat layout) is read from its directory directly.
+"""
+import os
+import fcntl
+import shutil
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from bot.broker import OHLCV_COLUMNS
+
+DEFAULT_ROOT = Path(__file__).resolve().parents[1] / "storage" / "candles"
+MANIFEST = "CURRENT"
+
+COLUMNS = {
+    "timestamp": np.dtype("<i8"),
+    "open": np.dtype("<f8"),
+    "high": np.dtype("<f8"),
+    "low": np.dtype("<f8"),
+    "close": np.dtype("<f8"),
+    "volume": np.dtype("<f8"),
+}
+
+
+def _safe(part):
+    return str(part).replace("/", "-").replace(":", "-")
+
+
+class CandleSeries:
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def _data_dir(self):
+        """The directory of the current column files, as named by the manifest."""
+        try:
+            name = (self.path / MANIFEST).read_text().strip()
+        except FileNotFoundError:
+            return self.path
+        return self.path / name
+
+    def _file(self, col, data_dir=None):
+        return (data_dir or self._data_dir()) / f"{col}.{COLUMNS[col].kind}{COLUMNS[col].itemsize}"
+
+    @contextmanager
+    def _locked(self):
+        # Bot and dashboard may both write; serialize appends and rewrites.
+        with open(self.path / ".lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def __len__(self):
+        return self._length(self._data_dir())
+
+    def _length(self, data_dir):
+        sizes = []
+        for col, dtype in COLUMNS.items():
+            f = self._file(col, data_dir)
+            sizes.append(f.stat().st_size // dtype.itemsize if f.exists() else 0)
+        # A crash mid-append can leave columns of unequal length; trust the shortest.
+        return min(sizes)
+
+    def last_ts(self):
+        data_dir = self._data_dir()
+        n = self._length(data_dir)
+        if not n:
+            return None
+        with open(self._file("timestamp", data_dir), "rb") as f:
+            f.seek((n - 1) * 8)
+            return int(np.frombuffer(f.read(8), dtype=COLUMNS["timestamp"])[0])
+
+    def columns(self):
+        """Memory-mapped column views over the whole series."""
+        data_dir = self._data_dir()
+        n = self._length(data_dir)
+        if not n:
+            return {col: np.empty(0, dtype=dtype) for col, dtype in COLUMNS.items()}
+        return {col: np.memmap(self._file(col, data_dir), dtype=dtype, mode="r", shape=(n,))
+                for col, dtype in COLUMNS.items()}
+
+    def read(self, start_ms=None, end_ms=None):
+        """Zero-copy views of bars with start_ms <= timestamp < end_ms."""
+        cols = self.columns()
+        ts = cols["timestamp"]
+        lo = 0 if start_ms is None else int(np.searchsorted(ts, start_ms, side="left"))
+        hi = len(ts) if end_ms is None else int(np.searchsorted(ts, end_ms, side="left"))
+        return {col: arr[lo:hi] for col, arr in cols.items()}
+
+    def frame(self, start_ms=None, end_ms=None, tail=None):
+        """DataFrame in Broker.fetch_ohlcv layout (copies the selected range)."""
+        cols = self.read(start_ms, end_ms)
+        if tail is not None:
+            cols = {col: arr[-tail:] for col, arr in cols.items()}
+        df = pd.DataFrame({col: np.array(arr) for col, arr in cols.items()}, columns=OHLCV_COLUMNS)
+        df["timestamp"] = pd.to_datetime(df["timestamp"], unit="ms", utc=True)
+        return df
+
+    def _rewrite(self, data):
+        current = self._data_dir()
+        generation = int(current.name[1:]) if current != self.path else 0
+        new = self.path / f"v{generation + 1}"
+        shutil.rmtree(new, ignore_errors=True)  # left over from a crashed rewrite
+        new.mkdir()
+        for col, dtype in COLUMNS.items():
+            with open(self._file(col, new), "wb") as f:
+                f.write(data[col].astype(dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        # The columns must be on disk before the manifest can name them.
+        tmp = self.path / f"{MANIFEST}.tmp"
+        with open(tmp, "w") as f:
+            f.write(new.name)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path / MANIFEST)
+        dir_fd = os.open(self.path, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        # Keep the generation just replaced for readers still holding its
+        # name; anything older (or the flat layout's files) can go.
+        for old in self.path.glob("v*"):
+            if old.is_dir() and old.name[1:].isdigit() and int(old.name[1:]) < generation:
+                shutil.rmtree(old, ignore_errors=True)
+        if current == self.path:
+            for col in COLUMNS:
+                self._file(col, self.path).unlink(missing_ok=True)
+
+    def merge(self, rows):
+        """
+        Add OHLCV rows ([ts, o, h, l, c, v], ascending). Rows newer than the
+        stored tail are appended; anything else triggers a sorted rewrite.
+        """
+        if not len(rows):
+            return 0
+        new = np.asarray(rows, dtype="float64")
+        new_ts = new[:, 0].astype("int64")
+        with self._locked():
+            data_dir = self._data_dir()
+            n = self._length(data_dir)
+            last = self.last_ts()
+            if last is None or (new_ts[0] > last and np.all(np.diff(new_ts) > 0)):
+                for i, (col, dtype) in enumerate(COLUMNS.items()):
+                    with open(self._file(col, data_dir), "r+b" if n else "wb") as f:
+                        f.seek(n * dtype.itemsize)
+                        f.truncate()
+                        f.write((new_ts if i == 0 else new[:, i]).astype(dtype).tobytes())
+                return len(new)
+            old = {col: np.array(arr) for col, arr in self.columns().items()}
+            ts = np.concatenate([new_ts, old["timestamp"]])
+            # np.unique keeps the first occurrence, so fresh rows win over stored ones.
+            ts, idx = np.unique(ts, return_index=True)
+            data = {"timestamp": ts}
+            for i, col in enumerate(list(COLUMNS)[1:], start=1):
+                data[col] = np.concatenate([new[:, i], old[col]])[idx]
+            self._rewrite(data)
+            return len(ts) - n
+
+    def gaps(self, bar_ms, start_ms=None, end_ms=None):
+        """Missing [from_ms, to_ms) ranges between start_ms and end_ms."""
+        ts = self.read(start_ms, end_ms)["timestamp"]
+        out = []
+        if start_ms is not None and len(ts) and ts[0] > start_ms:
+            out.append((int(start_ms), int(ts[0])))
+        elif start_ms is not None and not len(ts) and end_ms is not None:
+            out.append((int(start_ms), int(end_ms)))
+        if len(ts) > 1:
+            for i in np.flatnonzero(np.diff(ts) > bar_ms):
+                out.append((int(ts[i]) + bar_ms, int(ts[i + 1])))
+        if end_ms is not None and len(ts) and ts[-1] + bar_ms < end_ms:
+            out.append((int(ts[-1]) + bar_ms, int(end_ms)))
+        return out
+
+
+class OHLCVStore:
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = Path(root)
+        self._series = {}
+
+    def series(self, exchange_id, symbol, timeframe):
+        key = (exchange_id, symbol, timeframe)
+        if key not in self._series:
+            self._series[key] = CandleSeries(self.root / _safe(exchange_id) / _safe(symbol) / timeframe)
+        return self._series[key]
+
+    def backfill(self, source, symbol, timeframe, since_ms, until_ms=None, page=1000):
+        """
+        Fill missing closed bars in [since_ms, until_ms) through a Broker
+        (live mode) or any ccxt exchange. Returns the number of bars added.
+        """
+        exchange = getattr(source, "exchange", source)
+        if exchange is None:
+            raise RuntimeError("Backfill needs a live exchange connection.")
+        bar_ms = exchange.parse_timeframe(timeframe) * 1000
+        if until_ms is None:
+            until_ms = exchange.milliseconds() // bar_ms * bar_ms  # start of the open bar
+        series = self.series(exchange.id, symbol, timeframe)
+        added = 0
+        for start, end in series.gaps(bar_ms, since_ms, until_ms):
+            cursor = start
+            while cursor < end:
+                rows = exchange.fetch_ohlcv(symbol, timeframe=timeframe, since=cursor, limit=page)
+                rows = [r for r in rows if cursor <= r[0] < end]
+                if not rows:
+                    break
+                added += series.merge(rows)
+                cursor = rows[-1][0] + bar_ms
+        return added
+
+
+def load_frame(symbol, timeframe, exchange_id="coinbasepro", start_ms=None, end_ms=None, root=DEFAULT_ROOT):
+    return OHLCVStore(root).series(exchange_id, symbol, timeframe).frame(start_ms, end_ms)
+
+
+def read_candles(source, exchange_id, timeframe):
+    """Candles from a CSV path, or from the local store when `source` is a symbol."""
+    if Path(source).is_file():
+        candles = pd.read_csv(source)
+        if not pd.api.types.is_numeric_dtype(candles["timestamp"]):
+            candles["timestamp"] = pd.to_datetime(candles["timestamp"], utc=True)
+        return candles
+    return load_frame(source, timeframe, exchange_id=exchange_id)
+
+
+if __name__ == "__main__":
+    import argparse
+    import ccxt
+
+    ap = argparse.ArgumentParser(description="Backfill or inspect the local candle store.")
+    ap.add_argument("command", choices=["backfill", "gaps"])
+    ap.add_argument("exchange_id")
+    ap.add_argument("symbol")
+    ap.add_argument("timeframe")
+    ap.add_argument("--days", type=float, default=30)
+    args = ap.parse_args()
+
+    exchange = getattr(ccxt, args.exchange_id)({"enableRateLimit": True})
+    store = OHLCVStore()
+    since = exchange.milliseconds() - int(args.days * 86400 * 1000)
+    if args.command == "backfill":
+        print(f"added {store.backfill(exchange, args.symbol, args.timeframe, since)} bars")
+    else:
+        bar_ms = exchange.parse_timeframe(args.timeframe) * 1000
+        for start, end in store.series(args.exchange_id, args.symbol, args.timeframe).gaps(bar_ms, since):
+            print(pd.to_datetime(start, unit="ms", utc=True), "->", pd.to_datetime(end, unit="ms", utc=True))
@@ -0,0 +1,247 @@
+"""
+Process-wide exchange clients and request budget.
+
+`client()` hands out one ccxt instance per (exchange, API key, sync or
+async), so config reloads and dashboard reruns reuse its HTTP session
+and loaded markets instead of building a fresh client. Markets are also
+cached on disk (storage/markets) for MARKETS_TTL seconds, so a new
+process skips the `load_markets` round trip.
+
+`limiter()` returns the token bucket that every consumer of an exchange
+shares. With a `path` the bucket state lives in that file under an
+fcntl lock, so the bot, the dashboard and worker processes draw from
+one budget. Pooled sync clients pace every request through it via
+ccxt's throttle hook; async callers (AsyncBroker, OrderExecutor) acquire
+it explicitly, and never wait on its locks: when another thread or
+process holds the bucket they yield to the event loop and retry. Paper and sim runs never reach the exchange, so
+`limiter_for()` gives them an in-process bucket of their own rather than
+a share of the live budget.
+
+ccxt itself is imported on the first `client()` call, so paper and sim
+runs never load it.
+"""
+import os
+import json
+import time
+import fcntl
+import struct
+import asyncio
+import hashlib
+import logging
+import threading
+from pathlib import Path
+
+STORAGE = Path(__file__).resolve().parents[1] / "storage"
+MARKETS_DIR = STORAGE / "markets"
+LIMITER_DIR = STORAGE / "ratelimit"
+MARKETS_TTL = 24 * 3600
+LOCK_RETRY = 0.001  # seconds between async attempts while the bucket is locked
+
+_STATE = struct.Struct("<dd")  # tokens, wall-clock stamp
+
+
+def _ccxt(asynchronous):
+    try:
+        if asynchronous:
+            import ccxt.async_support as module
+        else:
+            import ccxt as module
+    except ImportError:
+        raise RuntimeError("ccxt is required for live mode.") from None
+    return module
+
+
+def _exchange_config():
+    api_key = os.getenv("EXCHANGE_API_KEY")
+    api_secret = os.getenv("EXCHANGE_API_SECRET")
+    if not api_key or not api_secret:
+        raise RuntimeError("Missing API keys for live trading.")
+    return {
+        "apiKey": api_key,
+        "secret": api_secret,
+        "enableRateLimit": True,
+    }
+
+
+class SharedRateLimiter:
+    """
+    Token bucket usable from threads and asyncio tasks alike. State is kept
+    in memory, or in `path` when it has to be shared between processes.
+    """
+
+    def __init__(self, rate=5.0, burst=10, path=None):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.path = Path(path) if path else None
+        self._tokens = float(burst)
+        self._stamp = time.time()
+        self._lock = threading.Lock()
+        if self.path is not None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+
+    def configure(self, rate, burst):
+        with self._lock:
+            self.rate = float(rate)
+            self.burst = float(burst)
+
+    def _take(self, tokens, stamp, cost):
+        """New (tokens, stamp) and the seconds to wait before retrying (0 when granted)."""
+        now = time.time()
+        tokens = min(self.burst, tokens + max(0.0, now - stamp) * self.rate)
+        if tokens >= cost:
+            return tokens - cost, now, 0.0
+        return tokens, now, (cost - tokens) / self.rate
+
+    def _try(self, cost, blocking=True):
+        """
+        Seconds to wait before retrying (0 when granted), or None when
+        `blocking` is off and another thread or process holds the bucket.
+        """
+        if not self._lock.acquire(blocking):
+            return None
+        try:
+            if self.path is None:
+                self._tokens, self._stamp, wait = self._take(self._tokens, self._stamp, cost)
+                return wait
+            with open(self.path, "a+b", buffering=0) as f:
+                try:
+                    fcntl.flock(f, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return None
+                try:
+                    f.seek(0)
+                    raw = f.read(_STATE.size)
+                    tokens, stamp = _STATE.unpack(raw) if len(raw) == _STATE.size else (self.burst, time.time())
+                    tokens, stamp, wait = self._take(tokens, stamp, cost)
+                    f.seek(0)
+                    f.truncate()
+                    f.write(_STATE.pack(tokens, stamp))
+                finally:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+            return wait
+        finally:
+            self._lock.release()
+
+    def acquire_sync(self, cost=1):
+        while (wait := self._try(cost)) > 0:
+            time.sleep(wait)
+
+    async def acquire(self, cost=1):
+        # A blocking flock here would stall every task on the loop.
+        while (wait := self._try(cost, blocking=False)) != 0:
+            await asyncio.sleep(LOCK_RETRY if wait is None else wait)
+
+
+_LIMITERS = {}
+_CLIENTS = {}
+_MARKETS = {}
+_LOCK = threading.Lock()
+
+
+def limiter(exchange_id, rate=5.0, burst=10, shared=False):
+    """The limiter for `exchange_id`; file-backed (cross-process) when `shared`."""
+    key = (exchange_id, bool(shared))
+    with _LOCK:
+        lim = _LIMITERS.get(key)
+        if lim is None:
+            path = LIMITER_DIR / f"{exchange_id}.bucket" if shared else None
+            lim = _LIMITERS[key] = SharedRateLimiter(rate, burst, path)
+    lim.configure(rate, burst)
+    return lim
+
+
+def limiter_for(cfg):
+    """Limiter for the configured exchange, `mode` and `rate_limit` settings."""
+    rl = cfg.get("rate_limit") or {}
+    rate, burst = rl.get("per_second", 5), rl.get("burst", 10)
+    mode = (cfg.get("mode") or "live").lower()
+    if mode in ("paper", "sim"):
+        return limiter(mode, rate=rate, burst=burst)
+    return limiter(cfg.get("exchange_id"), rate=rate, burst=burst, shared=rl.get("shared", False))
+
+
+def _markets_file(exchange_id):
+    return MARKETS_DIR / f"{exchange_id}.json"
+
+
+def _cached_markets(exchange_id):
+    if exchange_id in _MARKETS:
+        return _MARKETS[exchange_id]
+    f = _markets_file(exchange_id)
+    try:
+        if time.time() - f.stat().st_mtime < MARKETS_TTL:
+            with open(f) as fh:
+                _MARKETS[exchange_id] = json.load(fh)
+                return _MARKETS[exchange_id]
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _store_markets(exchange):
+    _MARKETS[exchange.id] = exchange.markets
+    try:
+        MARKETS_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = _markets_file(exchange.id).with_suffix(".tmp")
+        with open(tmp, "w") as fh:
+            json.dump(exchange.markets, fh)
+        os.replace(tmp, _markets_file(exchange.id))
+    except (OSError, TypeError, ValueError) as e:
+        logging.warning(f"Could not cache markets for {exchange.id}: {e}")
+
+
+def _key(exchange_id, config, asynchronous):
+    api_key = (config or {}).get("apiKey") or ""
+    digest = hashlib.sha256(api_key.encode()).hexdigest()[:16] if api_key else None
+    loop = id(asyncio.get_running_loop()) if asynchronous else None
+    return exchange_id, digest, asynchronous, loop
+
+
+def client(exchange_id, config=None, asynchronous=False, limiter=None):
+    """
+    Shared ccxt client. `config` defaults to the API keys from the
+    environment. Sync clients are paced by `limiter`; async clients are
+    bound to the running event loop and leave pacing to their callers.
+    """
+    module = _ccxt(asynchronous)
+    config = config if config is not None else _exchange_config()
+    key = _key(exchange_id, config, asynchronous)
+    with _LOCK:
+        exchange = _CLIENTS.get(key)
+        if exchange is None:
+            exchange = getattr(module, exchange_id)({**config, "enableRateLimit": not asynchronous})
+            markets = _cached_markets(exchange_id)
+            if markets:
+                exchange.set_markets(markets)
+            _CLIENTS[key] = exchange
+    if limiter is not None and not asynchronous:
+        exchange.throttle = lambda cost=None: limiter.acquire_sync(cost or 1)
+    if not asynchronous and not exchange.markets:
+        exchange.load_markets()
+        _store_markets(exchange)
+    return exchange
+
+
+async def load_markets(exchange):
+    """Load (or reuse cached) markets for an async client."""
+    if not exchange.markets:
+        await exchange.load_markets()
+        _store_markets(exchange)
+    return exchange.markets
+
+
+def pooled(exchange):
+    return any(exchange is c for c in _CLIENTS.values())
+
+
+async def close_all():
+    """Close async clients created on the running loop."""
+    loop = id(asyncio.get_running_loop())
+    with _LOCK:
+        keys = [k for k in _CLIENTS if k[2] and k[3] == loop]
+        clients = [_CLIENTS.pop(k) for k in keys]
+    for exchange in clients:
+        try:
+            await exchange.close()
+        except Exception as e:
+            logging.error(f"Closing {exchange.id} client failed: {e}")
@@ -0,0 +1,290 @@
+"""
+Order execution for live (and fake) exchanges.
+
+Every order gets a client order id that is reused across retries, so a
+request that timed out after reaching the exchange is found again
+(through `fetch_orders`) instead of being sent twice. Network and
+rate-limit errors are retried with exponential backoff; rejections such
+as insufficient funds are not. An exchange without `fetchOrders` cannot
+be asked whether a timed-out request arrived, so the order is not resent
+and OrderError names its client order id instead. Once acknowledged, an
+order is polled with `fetch_order` until it is filled, first after
+FIRST_POLL seconds and then backing off to `poll_interval` (any polling error
+is logged and polling continues until `fill_timeout`), and the fill price
+and fees reported by the exchange are returned. An order still open at
+`fill_timeout` is cancelled and fetched once more; whatever filled by then
+comes back as a partial fill. OrderError has `unresolved` set when the
+order may still be live or filled on the exchange (the cancel failed, or
+a submit's outcome is unknown), so the caller can record it for
+reconciliation.
+
+Each order's submit -> ack -> fill latency, retry count and slippage
+against the reference price are kept in `records` for `stats()`.
+"""
+import sys
+import time
+import uuid
+import asyncio
+import logging
+from collections import deque
+
+from bot import metrics
+
+NETWORK_ERRORS = (ConnectionError, TimeoutError, asyncio.TimeoutError)
+RATE_LIMITED = ("RateLimitExceeded", "DDoSProtection")
+MAX_RECORDS = 1000
+# Market orders usually fill within tens of ms of the ack; don't wait a full poll interval for those.
+FIRST_POLL = 0.02
+TERMINAL = ("closed", "canceled", "rejected", "expired")
+
+
+def retryable():
+    """
+    Exceptions worth retrying. ccxt's NetworkError joins once ccxt has been
+    imported; nothing can raise it before that, so ccxt stays unloaded in
+    paper and sim mode.
+    """
+    ccxt = sys.modules.get("ccxt")
+    return NETWORK_ERRORS + ((ccxt.NetworkError,) if ccxt is not None else ())
+
+
+class OrderError(Exception):
+    """
+    An order could not be placed or did not fill. `client_id`, and
+    `order_id` once the exchange acknowledged it, identify the order for
+    reconciliation; `order` is the last state seen. `unresolved` means the
+    order may still exist or have filled on the exchange.
+    """
+
+    def __init__(self, message, client_id=None, order_id=None, order=None, unresolved=False):
+        super().__init__(message)
+        self.client_id = client_id
+        self.order_id = order_id
+        self.order = order
+        self.unresolved = unresolved
+
+
+def client_order_id(prefix="bot"):
+    return f"{prefix}-{uuid.uuid4().hex[:24]}"
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def order_fee(order, price):
+    """Total fee of a ccxt order in quote currency."""
+    fees = order.get("fees") or ([order["fee"]] if order.get("fee") else [])
+    base = order.get("symbol", "").split("/")[0]
+    total = 0.0
+    for fee in fees:
+        cost = float(fee.get("cost") or 0.0)
+        total += cost * price if fee.get("currency") == base else cost
+    return total
+
+
+class OrderExecutor:
+    def __init__(self, exchange, limiter=None, max_retries=3, backoff=0.5, fill_timeout=30.0,
+                 poll_interval=0.5, max_inflight=4):
+        self.exchange = exchange
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.fill_timeout = fill_timeout
+        self.poll_interval = poll_interval
+        self.records = deque(maxlen=MAX_RECORDS)
+        self.failures = 0
+        self._inflight = asyncio.Semaphore(max_inflight)
+
+    async def _call(self, fn, *args, **kwargs):
+        if self.limiter is not None:
+            await self.limiter.acquire()
+        metrics.API_CALLS.labels(getattr(fn, "__name__", "call")).inc()
+        return await fn(*args, **kwargs)
+
+    async def _lookup(self, symbol, client_id, since_ms):
+        """The order carrying `client_id`, if the exchange has it."""
+        if not self.exchange.has.get("fetchOrders"):
+            return None
+        try:
+            orders = await self._call(self.exchange.fetch_orders, symbol, since=since_ms - 60_000)
+        except Exception as e:
+            logging.warning(f"[{symbol}] Order lookup for {client_id} failed: {e}")
+            return None
+        return next((o for o in orders if o.get("clientOrderId") == client_id), None)
+
+    async def _submit(self, symbol, side, qty, client_id):
+        """Create the order, retrying ambiguous failures; returns (order, attempts)."""
+        since_ms = self.exchange.milliseconds()
+        for attempt in range(1, self.max_retries + 2):
+            try:
+                order = await self._call(self.exchange.create_order, symbol, "market", side, qty,
+                                         params={"clientOrderId": client_id})
+                return order, attempt
+            except retryable() as e:
+                metrics.ERRORS.labels("api").inc()
+                if attempt > self.max_retries:
+                    raise OrderError(f"{side} {qty} {symbol} failed after {attempt} attempts: {e}",
+                                     client_id=client_id, unresolved=True) from e
+                rate_limited = type(e).__name__ in RATE_LIMITED
+                if not rate_limited and not self.exchange.has.get("fetchOrders"):
+                    # It may have reached the exchange, and we have no way to ask.
+                    raise OrderError(f"{side} {qty} {symbol} outcome unknown after {e}; not resending "
+                                     f"client order {client_id}", client_id=client_id, unresolved=True) from e
+                delay = self.backoff * 2 ** (attempt - 1) * (4 if rate_limited else 1)
+                logging.warning(f"[{symbol}] Order {client_id} attempt {attempt} failed ({e}); retrying in {delay:.2f}s")
+                await asyncio.sleep(delay)
+                # The request may have reached the exchange before the error.
+                order = await self._lookup(symbol, client_id, since_ms)
+                if order is not None:
+                    return order, attempt
+            except Exception as e:
+                raise OrderError(f"{side} {qty} {symbol} rejected: {e}", client_id=client_id) from e
+
+    async def _await_fill(self, order, symbol):
+        deadline = time.monotonic() + self.fill_timeout
+        delay = min(FIRST_POLL, self.poll_interval)
+        while order.get("status") not in TERMINAL:
+            if time.monotonic() >= deadline:
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.poll_interval)
+            try:
+                order = await self._call(self.exchange.fetch_order, order["id"], symbol)
+            except Exception as e:
+                # The order exists on the exchange; keep the last state seen rather than lose it.
+                metrics.ERRORS.labels("api").inc()
+                logging.warning(f"[{symbol}] fetch_order {order['id']} failed: {e}")
+        return order
+
+    async def _cancel(self, order, symbol, client_id):
+        """
+        Cancel an order that outlived `fill_timeout` and return its final
+        state; raises an unresolved OrderError when that state is unknown.
+        """
+        error = None
+        try:
+            await self._call(self.exchange.cancel_order, order["id"], symbol)
+        except Exception as e:
+            # It may have filled in the meantime; the fetch below tells.
+            metrics.ERRORS.labels("api").inc()
+            error = e
+        try:
+            order = await self._call(self.exchange.fetch_order, order["id"], symbol)
+        except Exception as e:
+            metrics.ERRORS.labels("api").inc()
+            error = error or e
+        if order.get("status") not in TERMINAL:
+            raise OrderError(f"order {order.get('id')} ({client_id}) still {order.get('status')} after "
+                             f"{self.fill_timeout:g}s and could not be cancelled: {error}",
+                             client_id=client_id, order_id=order.get("id"), order=order, unresolved=True)
+        return order
+
+    async def execute(self, symbol, side, qty, ref_price=None):
+        """
+        Place a market order and wait for its fill. Returns a dict with the
+        filled qty, average price, fee and latencies; raises OrderError.
+        """
+        client_id = client_order_id()
+        async with self._inflight:
+            t0 = time.perf_counter()
+            try:
+                order, attempts = await self._submit(symbol, side, qty, client_id)
+                t_ack = time.perf_counter()
+                order = await self._await_fill(order, symbol)
+                if order.get("status") not in TERMINAL:
+                    order = await self._cancel(order, symbol, client_id)
+            except OrderError:
+                self.failures += 1
+                raise
+            t_fill = time.perf_counter()
+
+        filled = float(order.get("filled") or 0.0)
+        if filled <= 0:
+            self.failures += 1
+            raise OrderError(f"order {order.get('id')} ({client_id}) not filled: status {order.get('status')}",
+                             client_id=client_id, order_id=order.get("id"), order=order)
+        price = float(order.get("average") or order.get("price") or ref_price)
+        slippage_bps = None
+        if ref_price:
+            sign = 1 if side == "buy" else -1
+            slippage_bps = sign * (price - ref_price) / ref_price * 1e4
+        record = {
+            "symbol": symbol,
+            "side": side,
+            "qty": float(qty),
+            "filled": filled,
+            "price": price,
+            "ref_price": ref_price,
+            "fee": order_fee(order, price),
+            "order_id": order.get("id"),
+            "client_order_id": client_id,
+            "attempts": attempts,
+            "ack_ms": (t_ack - t0) * 1000,
+            "fill_ms": (t_fill - t0) * 1000,
+            "slippage_bps": slippage_bps,
+        }
+        self.records.append(record)
+        if order.get("status") != "closed":
+            logging.warning(f"[{symbol}] Order {record['order_id']} {order.get('status')} with {filled}/{qty} filled")
+        return record
+
+    def stats(self):
+        """Latency percentiles (ms), mean slippage (bps) and failure count over recent orders."""
+        acks = [r["ack_ms"] for r in self.records]
+        fills = [r["fill_ms"] for r in self.records]
+        slips = [r["slippage_bps"] for r in self.records if r["slippage_bps"] is not None]
+        return {
+            "orders": len(self.records),
+            "failures": self.failures,
+            "retries": sum(r["attempts"] - 1 for r in self.records),
+            "ack_p50_ms": _percentile(acks, 0.5),
+            "ack_p95_ms": _percentile(acks, 0.95),
+            "fill_p50_ms": _percentile(fills, 0.5),
+            "fill_p95_ms": _percentile(fills, 0.95),
+            "slippage_bps": sum(slips) / len(slips) if slips else None,
+            "fees": sum(r["fee"] for r in self.records),
+        }
+
+
+if __name__ == "__main__":
+    import argparse
+    from bot.exchanges import SharedRateLimiter
+    from bot.fake_exchange import FakeExchange
+
+    ap = argparse.ArgumentParser(description="Load-test the execution path against the fake exchange.")
+    ap.add_argument("--orders", type=int, default=500)
+    ap.add_argument("--symbols", type=int, default=10)
+    ap.add_argument("--fail-rate", type=float, default=0.05)
+    ap.add_argument("--lost-ack-rate", type=float, default=0.02)
+    ap.add_argument("--rate-limit", type=float, default=200.0, help="requests per second")
+    ap.add_argument("--inflight", type=int, default=32)
+    ap.add_argument("--seed", type=int, default=1)
+    args = ap.parse_args()
+
+    async def bench():
+        exchange = FakeExchange(fail_rate=args.fail_rate, lost_ack_rate=args.lost_ack_rate, seed=args.seed)
+        executor = OrderExecutor(exchange, SharedRateLimiter(args.rate_limit, args.rate_limit), backoff=0.05,
+                                 poll_interval=0.01, max_inflight=args.inflight)
+        symbols = [f"S{i}/USDT" for i in range(args.symbols)]
+
+        async def one(i):
+            side = "buy" if i % 2 == 0 else "sell"
+            try:
+                await executor.execute(symbols[i % len(symbols)], side, 0.001, ref_price=30000.0)
+            except OrderError as e:
+                logging.error(e)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(args.orders)))
+        elapsed = time.perf_counter() - t0
+        duplicates = len(exchange.orders) - len(executor.records)
+        print(f"{len(executor.records)} orders in {elapsed:.2f}s ({len(executor.records) / elapsed:.0f}/s), "
+              f"{duplicates} duplicate submissions")
+        for key, value in executor.stats().items():
+            print(f"  {key}: {value:.3f}" if isinstance(value, float) else f"  {key}: {value}")
+
+    asyncio.run(bench())
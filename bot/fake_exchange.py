@@ -0,0 +1,135 @@
+"""
+In-process stand-in for a ccxt async exchange, for exercising the order
+path without network access.
+
+It implements the calls the bot makes (create_order, fetch_order,
+fetch_orders, cancel_order, fetch_ticker) with configurable ack/fill latency, fees,
+spread and injected failures: requests that never reach the "exchange",
+acks lost after the order was accepted, and rate-limit rejections.
+Orders are deduplicated by `clientOrderId` like real venues do.
+"""
+import time
+import random
+import asyncio
+import itertools
+
+
+# Named like ccxt's, without importing it: the executor treats any
+# ConnectionError as retryable and recognizes rate limits by class name.
+class NetworkError(ConnectionError):
+    pass
+
+
+class RateLimitExceeded(NetworkError):
+    pass
+
+
+class OrderNotFound(KeyError):
+    pass
+
+
+class FakeExchange:
+    id = "fake"
+    has = {"createOrder": True, "fetchOrder": True, "fetchOrders": True, "cancelOrder": True, "fetchTicker": True}
+
+    def __init__(self, prices=None, fee_rate=0.001, spread=0.0002, ack_latency=0.005, fill_latency=0.02,
+                 fail_rate=0.0, lost_ack_rate=0.0, rate_limit_rate=0.0, seed=None):
+        self.prices = dict(prices or {})
+        self.fee_rate = fee_rate
+        self.spread = spread
+        self.ack_latency = ack_latency
+        self.fill_latency = fill_latency
+        self.fail_rate = fail_rate
+        self.lost_ack_rate = lost_ack_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.rng = random.Random(seed)
+        self.orders = {}
+        self._by_client_id = {}
+        self._ids = itertools.count(1)
+
+    def milliseconds(self):
+        return int(time.time() * 1000)
+
+    def price(self, symbol):
+        return self.prices.setdefault(symbol, 30000.0)
+
+    def _quote(self, symbol):
+        mid = self.price(symbol)
+        half = mid * self.spread / 2
+        return mid - half, mid + half
+
+    def _fill_price(self, order):
+        bid, ask = self._quote(order["symbol"])
+        return ask if order["side"] == "buy" else bid
+
+    def _latency(self, kind):
+        """Seconds to wait for an "ack" or a "fill"."""
+        return self.ack_latency if kind == "ack" else self.fill_latency
+
+    def _settle(self, order):
+        """Fill an open order once its fill latency has passed."""
+        if order["status"] == "open" and time.monotonic() >= order["_fill_at"]:
+            price = self._fill_price(order)
+            cost = price * order["amount"]
+            order.update(status="closed", filled=order["amount"], remaining=0.0, average=price,
+                         price=price, cost=cost,
+                         fee={"cost": cost * self.fee_rate, "currency": order["symbol"].split("/")[1]})
+        return {k: v for k, v in order.items() if not k.startswith("_")}
+
+    async def create_order(self, symbol, type, side, amount, price=None, params=None):
+        params = params or {}
+        await asyncio.sleep(self._latency("ack"))
+        if self.rng.random() < self.rate_limit_rate:
+            raise RateLimitExceeded("fake: rate limit exceeded")
+        if self.rng.random() < self.fail_rate:
+            raise NetworkError("fake: request timed out")
+        client_id = params.get("clientOrderId")
+        if client_id in self._by_client_id:
+            return self._settle(self.orders[self._by_client_id[client_id]])
+        order_id = str(next(self._ids))
+        self.orders[order_id] = {
+            "id": order_id, "clientOrderId": client_id, "timestamp": self.milliseconds(),
+            "symbol": symbol, "type": type, "side": side, "amount": float(amount),
+            "filled": 0.0, "remaining": float(amount), "status": "open",
+            "average": None, "price": None, "cost": 0.0, "fee": None,
+            "_fill_at": time.monotonic() + self._latency("fill"),
+        }
+        if client_id is not None:
+            self._by_client_id[client_id] = order_id
+        if self.rng.random() < self.lost_ack_rate:
+            raise NetworkError("fake: connection reset after submit")
+        return self._settle(self.orders[order_id])
+
+    async def create_market_order(self, symbol, side, amount, price=None, params=None):
+        return await self.create_order(symbol, "market", side, amount, price, params)
+
+    async def fetch_order(self, id, symbol=None, params=None):
+        await asyncio.sleep(self._latency("ack"))
+        if id not in self.orders:
+            raise OrderNotFound(f"fake: order {id} not found")
+        return self._settle(self.orders[id])
+
+    async def cancel_order(self, id, symbol=None, params=None):
+        await asyncio.sleep(self._latency("ack"))
+        if id not in self.orders:
+            raise OrderNotFound(f"fake: order {id} not found")
+        order = self.orders[id]
+        self._settle(order)
+        if order["status"] != "open":
+            raise OrderNotFound(f"fake: order {id} is {order['status']}")
+        order["status"] = "canceled"
+        return self._settle(order)
+
+    async def fetch_orders(self, symbol=None, since=None, limit=None, params=None):
+        await asyncio.sleep(self._latency("ack"))
+        out = [self._settle(o) for o in self.orders.values()
+               if (symbol is None or o["symbol"] == symbol) and (since is None or o["timestamp"] >= since)]
+        return out[-limit:] if limit else out
+
+    async def fetch_ticker(self, symbol):
+        bid, ask = self._quote(symbol)
+        return {"symbol": symbol, "timestamp": self.milliseconds(), "bid": bid, "ask": ask,
+                "last": self.price(symbol)}
+
+    async def close(self):
+        pass
@@ -0,0 +1,111 @@
+"""
+Position guardian: stop-loss / take-profit exits at tick level.
+
+Watches every open row of the `position` table, independent of candle
+evaluation. With a market stream every trade is checked as it arrives;
+otherwise the guardian polls tickers every `interval` seconds and checks
+the best bid (what a market sell would hit). Exits go through the
+owning SymbolTrader so they serialize with its strategy step.
+
+Exit latency is measured from the moment a price is observed to the
+moment the exit order returns; exits over `latency_budget_ms` are logged.
+Each one is also recorded as the `guardian_exit` stage in bot.metrics.
+"""
+import time
+import asyncio
+import logging
+import sqlite3
+from collections import deque
+
+from bot import metrics
+from bot.journal import load_positions
+
+LATENCY_SAMPLES = 500
+
+
+class PositionGuardian:
+    def __init__(self, runtime, interval=1.0, latency_budget_ms=250):
+        self.runtime = runtime
+        self.interval = interval
+        self.latency_budget_ms = latency_budget_ms
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.orphans = {}
+        self._pending = set()
+
+    def refresh(self, make_trader):
+        """
+        Pick up positions whose symbol has no running trader (e.g. removed
+        from `symbols` while a position was open) so they stay protected;
+        `make_trader(symbol)` builds the (not running) trader that exits them.
+        """
+        rt = self.runtime
+        rt.journal.flush()
+        with sqlite3.connect(rt.db_path) as con:
+            rows = load_positions(con)
+        self.orphans = {
+            symbol: self.orphans.get(symbol) or make_trader(symbol)
+            for symbol in rows
+            if symbol not in rt.tasks
+        }
+
+    def _trader(self, symbol):
+        return self.runtime.traders.get(symbol) or self.orphans.get(symbol)
+
+    def watched(self):
+        """Symbols with an open position."""
+        traders = {**self.orphans, **self.runtime.traders}
+        return [s for s, t in traders.items() if t.position is not None]
+
+    def check(self, symbol, price, seen=None):
+        """Start an exit if `price` crossed the SL/TP of `symbol`'s position."""
+        if self.runtime.portfolio is not None:
+            self.runtime.portfolio.mark(symbol, price)
+        trader = self._trader(symbol)
+        if trader is None or trader.position is None or symbol in self._pending:
+            return False
+        stop_price, target_price = trader.exit_levels()
+        if stop_price < price < target_price:
+            return False
+        self._pending.add(symbol)
+        self.runtime.spawn(self._exit(trader, price, seen or time.perf_counter()))
+        return True
+
+    async def _exit(self, trader, price, seen):
+        try:
+            if not await trader.on_price(price):
+                return
+            ms = (time.perf_counter() - seen) * 1000
+            self.latencies.append(ms)
+            metrics.STAGE_SECONDS.labels("guardian_exit").observe(ms / 1000)
+            if ms > self.latency_budget_ms:
+                logging.warning(f"[{trader.symbol}] Exit took {ms:.0f} ms (budget {self.latency_budget_ms} ms)")
+            else:
+                logging.info(f"[{trader.symbol}] Exit latency {ms:.1f} ms")
+            if trader.symbol in self.orphans:
+                del self.orphans[trader.symbol]
+        except Exception as e:
+            logging.error(f"[{trader.symbol}] Guardian exit failed: {e}")
+            metrics.ERRORS.labels("guardian").inc()
+        finally:
+            self._pending.discard(trader.symbol)
+
+    async def _poll(self, symbol):
+        ticker = await self.runtime.broker.fetch_ticker(symbol)
+        if ticker and ticker.get("bid"):
+            self.check(symbol, float(ticker["bid"]), time.perf_counter())
+
+    async def run(self):
+        """Ticker polling for positions the market stream does not carry."""
+        while True:
+            stream = self.runtime.stream
+            symbols = [s for s in self.watched() if stream is None or s not in stream.builders]
+            if symbols:
+                await asyncio.gather(*(self._poll(s) for s in symbols), return_exceptions=True)
+            await asyncio.sleep(self.interval)
+
+    def stats(self):
+        """Count, median and worst exit latency in ms."""
+        if not self.latencies:
+            return {"count": 0, "p50_ms": None, "max_ms": None}
+        ordered = sorted(self.latencies)
+        return {"count": len(ordered), "p50_ms": ordered[len(ordered) // 2], "max_ms": ordered[-1]}
@@ -0,0 +1,188 @@
+"""
+Streaming indicators that update in O(1) per bar.
+
+Each indicator is fed closed bars with `update()` and can evaluate the
+still-open bar with `peek()` without changing its state. Values match
+pandas over the same series: `ewm(span=...).mean()` for the EMA, and for
+the RSI rolling means of gains and losses where the first bar, having no
+previous close, counts as a zero change (so the first value appears at
+index `period - 1`). `ema_series` and `rsi_series` compute whole series
+at once for backtests.
+"""
+import math
+from collections import deque
+import numpy as np
+import pandas as pd
+
+NAN = float("nan")
+
+
+def ema_series(close, span):
+    """Whole-series EMA as a NumPy array (same as `ewm(span=span).mean()`)."""
+    return pd.Series(close, dtype="float64").ewm(span=span).mean().to_numpy()
+
+
+def rsi_series(close, period=14):
+    """Whole-series RSI as a NumPy array (same as `RSI.update` bar by bar)."""
+    delta = np.diff(np.asarray(close, dtype="float64"), prepend=np.nan)
+    gain = pd.Series(np.where(delta > 0, delta, 0.0))
+    loss = pd.Series(np.where(delta < 0, -delta, 0.0))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rs = gain.rolling(window=period).mean().to_numpy() / loss.rolling(window=period).mean().to_numpy()
+        return 100 - (100 / (1 + rs))
+
+
+class EMA:
+    """Adjusted EMA, identical to `Series.ewm(span=span).mean()`."""
+
+    def __init__(self, span):
+        self.span = span
+        self.alpha = 2.0 / (span + 1.0)
+        self._num = 0.0
+        self._den = 0.0
+        self.value = NAN
+
+    def _step(self, x):
+        decay = 1.0 - self.alpha
+        return self._num * decay + x, self._den * decay + 1.0
+
+    def update(self, x):
+        self._num, self._den = self._step(float(x))
+        self.value = self._num / self._den
+        return self.value
+
+    def peek(self, x):
+        num, den = self._step(float(x))
+        return num / den
+
+
+def _rsi(avg_gain, avg_loss):
+    if math.isnan(avg_gain) or math.isnan(avg_loss):
+        return NAN
+    if avg_loss == 0:
+        return NAN if avg_gain == 0 else 100.0
+    return 100.0 - 100.0 / (1.0 + avg_gain / avg_loss)
+
+
+class RSI:
+    """
+    RSI over `period` price changes.
+
+    By default averages are simple rolling means, with the first bar
+    counted as a zero change (see the module docstring). With
+    `wilder=True` they use Wilder's smoothing, seeded by the first simple
+    mean.
+    """
+
+    def __init__(self, period=14, wilder=False):
+        self.period = period
+        self.wilder = wilder
+        self._prev_close = None
+        self._window = deque(maxlen=period)
+        self._avg_gain = NAN
+        self._avg_loss = NAN
+        self.value = NAN
+
+    def _averages(self, close):
+        """Return (avg_gain, avg_loss, window_entry) for a new close."""
+        delta = 0.0 if self._prev_close is None else close - self._prev_close
+        entry = (max(delta, 0.0), max(-delta, 0.0))
+        n = self.period
+        if self.wilder and not math.isnan(self._avg_gain):
+            return ((self._avg_gain * (n - 1) + entry[0]) / n,
+                    (self._avg_loss * (n - 1) + entry[1]) / n,
+                    entry)
+        window = list(self._window)[-(n - 1):] if n > 1 else []
+        window.append(entry)
+        if len(window) < n:
+            return NAN, NAN, entry
+        return (sum(g for g, _ in window) / n,
+                sum(l for _, l in window) / n,
+                entry)
+
+    def update(self, close):
+        close = float(close)
+        self._avg_gain, self._avg_loss, entry = self._averages(close)
+        self._window.append(entry)
+        self._prev_close = close
+        self.value = _rsi(self._avg_gain, self._avg_loss)
+        return self.value
+
+    def peek(self, close):
+        avg_gain, avg_loss, _ = self._averages(float(close))
+        return _rsi(avg_gain, avg_loss)
+
+
+class Crossover:
+    """Fast/slow EMA pair; signal is 1 while fast is above slow, else 0."""
+
+    def __init__(self, fast=12, slow=26):
+        self.fast = EMA(fast)
+        self.slow = EMA(slow)
+        self.signal = None
+        self.prev_signal = None
+
+    def update(self, close):
+        f, s = self.fast.update(close), self.slow.update(close)
+        self.prev_signal, self.signal = self.signal, int(f > s)
+        return self.signal
+
+    def peek(self, close):
+        return int(self.fast.peek(close) > self.slow.peek(close))
+
+    @property
+    def crossed_up(self):
+        return self.prev_signal == 0 and self.signal == 1
+
+    @property
+    def crossed_down(self):
+        return self.prev_signal == 1 and self.signal == 0
+
+
+class SignalEngine:
+    """
+    EMA crossover + RSI state for one symbol.
+
+    `feed(df)` takes an OHLCV frame whose last row is the still-open bar,
+    updates state from closed bars it has not seen yet and returns
+    `(last, prev)` dicts with the same keys the pandas path adds to the
+    frame: close, ema_fast, ema_slow, signal, rsi.
+    """
+
+    def __init__(self, fast=12, slow=26, rsi_period=14, wilder=False):
+        self.cross = Crossover(fast, slow)
+        self.rsi = RSI(rsi_period, wilder=wilder)
+        self.last_ts = None
+        self._closed = None
+
+    def update(self, close):
+        self.cross.update(close)
+        self.rsi.update(close)
+        self._closed = {
+            "close": float(close),
+            "ema_fast": self.cross.fast.value,
+            "ema_slow": self.cross.slow.value,
+            "signal": self.cross.signal,
+            "rsi": self.rsi.value,
+        }
+        return self._closed
+
+    def peek(self, close):
+        return {
+            "close": float(close),
+            "ema_fast": self.cross.fast.peek(close),
+            "ema_slow": self.cross.slow.peek(close),
+            "signal": self.cross.peek(close),
+            "rsi": self.rsi.peek(close),
+        }
+
+    def feed(self, df):
+        if len(df) < 2:
+            raise ValueError("need at least two bars")
+        ts = df["timestamp"].tolist()
+        closes = df["close"].tolist()
+        for t, c in zip(ts[:-1], closes[:-1]):
+            if self.last_ts is None or t > self.last_ts:
+                self.update(c)
+                self.last_ts = t
+        return self.peek(closes[-1]), self._closed
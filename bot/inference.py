@@ -0,0 +1,256 @@
+"""
+Local inference server: one warm AIModel shared by every strategy process.
+
+`InferenceServer` loads the model once and listens on a Unix socket.
+Callers send feature batches (stacked arrays, see
+ai_wrapper.stack_features); requests that arrive within `max_wait_ms` of
+each other are concatenated and go through the model in one
+`predict_batch` call, up to `max_batch` rows, then the results are split
+back per caller. The model must have `predict_batch`: callers only send
+the stacked feature columns, not the OHLCV frame `AIModel.predict`
+scores, so a model without it is refused when the server is created.
+
+`InferenceClient` has the same `predict_batch` signature as the model,
+so SmartAIBot can use it in place of a local AIModel
+(`SmartAIBot(inference_socket=...)`) and skip loading the model at all.
+
+Wire format, both directions: struct "<II" (metadata length, payload
+length), JSON metadata ({"shape", "dtype"} or {"error"}), then the raw
+array bytes.
+"""
+import json
+import time
+import socket
+import struct
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+import numpy as np
+
+DEFAULT_SOCKET = Path(__file__).resolve().parents[1] / "storage" / "inference.sock"
+HEADER = struct.Struct("<II")
+
+
+def _encode(array=None, error=None):
+    if error is not None:
+        meta, payload = {"error": error}, b""
+    else:
+        array = np.ascontiguousarray(array)
+        meta, payload = {"shape": array.shape, "dtype": array.dtype.str}, array.tobytes()
+    meta = json.dumps(meta).encode()
+    return HEADER.pack(len(meta), len(payload)) + meta + payload
+
+
+def _decode(meta, payload):
+    meta = json.loads(meta)
+    if "error" in meta:
+        raise RuntimeError(f"inference server: {meta['error']}")
+    return np.frombuffer(payload, dtype=meta["dtype"]).reshape(meta["shape"])
+
+
+def load_model():
+    from ai_engine.model import AIModel
+    return AIModel()
+
+
+class InferenceServer:
+    def __init__(self, path=DEFAULT_SOCKET, model=None, max_batch=1024, max_wait_ms=2.0):
+        self.path = Path(path)
+        self.model = model if model is not None else load_model()
+        if not callable(getattr(self.model, "predict_batch", None)):
+            raise TypeError(f"{type(self.model).__name__} has no predict_batch(); "
+                            f"the inference server only serves batched models.")
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.batches = 0
+        self.rows = 0
+        self._queue = None
+        self._server = None
+        self._batcher = None
+        # One model call at a time, off the event loop.
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix="inference")
+
+    def _predict(self, features):
+        return np.asarray(self.model.predict_batch(features)).reshape(-1)
+
+    async def _next_batch(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self._queue.get()]
+        rows = len(batch[0][0])
+        deadline = loop.time() + self.max_wait
+        while rows < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            rows += len(item[0])
+        return batch
+
+    async def _run_batches(self):
+        while True:
+            batch = await self._next_batch()
+            # Only same-shaped features can share a model call.
+            groups = {}
+            for features, future in batch:
+                groups.setdefault(features.shape[1:], []).append((features, future))
+            for items in groups.values():
+                stacked = np.concatenate([f for f, _ in items])
+                try:
+                    result = await asyncio.get_running_loop().run_in_executor(self._executor, self._predict, stacked)
+                except Exception as e:
+                    for _, future in items:
+                        if not future.done():
+                            future.set_exception(e)
+                    continue
+                self.batches += 1
+                self.rows += len(stacked)
+                start = 0
+                for features, future in items:
+                    if not future.done():
+                        future.set_result(result[start:start + len(features)])
+                    start += len(features)
+
+    async def _handle(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    meta_len, size = HEADER.unpack(await reader.readexactly(HEADER.size))
+                    meta = await reader.readexactly(meta_len)
+                    payload = await reader.readexactly(size)
+                except asyncio.IncompleteReadError:
+                    break
+                try:
+                    features = _decode(meta, payload)
+                    future = loop.create_future()
+                    self._queue.put_nowait((features, future))
+                    reply = _encode(await future)
+                except Exception as e:
+                    reply = _encode(error=str(e))
+                writer.write(reply)
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.unlink(missing_ok=True)
+        self._queue = asyncio.Queue()
+        self._batcher = asyncio.create_task(self._run_batches(), name="inference:batch")
+        self._server = await asyncio.start_unix_server(self._handle, path=str(self.path))
+        logging.info(f"Inference server listening on {self.path}")
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+        self._batcher.cancel()
+        self.path.unlink(missing_ok=True)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    def stats(self):
+        return {"batches": self.batches, "rows": self.rows,
+                "rows_per_batch": self.rows / self.batches if self.batches else None}
+
+
+class InferenceClient:
+    """Blocking client; one connection, reconnected on failure. Thread-safe."""
+
+    def __init__(self, path=DEFAULT_SOCKET, timeout=5.0):
+        self.path = str(path)
+        self.timeout = timeout
+        self._sock = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._sock = sock
+        return self._sock
+
+    def _recv(self, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self._sock.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("inference server closed the connection")
+            buf += chunk
+        return bytes(buf)
+
+    def predict_batch(self, features):
+        request = _encode(np.asarray(features, dtype="float64"))
+        with self._lock:
+            try:
+                self._connect().sendall(request)
+                meta_len, size = HEADER.unpack(self._recv(HEADER.size))
+                meta = self._recv(meta_len)
+                payload = self._recv(size)
+            except OSError:
+                self.close()
+                raise
+        return _decode(meta, payload)
+
+    def close(self):
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Serve AIModel predictions over a Unix socket.")
+    ap.add_argument("--socket", default=str(DEFAULT_SOCKET))
+    ap.add_argument("--max-batch", type=int, default=1024)
+    ap.add_argument("--max-wait-ms", type=float, default=2.0)
+    ap.add_argument("--bench", type=int, default=0, metavar="CLIENTS",
+                    help="instead of serving, run CLIENTS threads against a server with a stub model")
+    args = ap.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+
+    if not args.bench:
+        server = InferenceServer(args.socket, max_batch=args.max_batch, max_wait_ms=args.max_wait_ms)
+        asyncio.run(server.serve_forever())
+    else:
+        class StubModel:
+            def predict_batch(self, features):
+                return np.sign(features[:, -1, 1] - features[:, -1, 2])
+
+        async def bench():
+            server = await InferenceServer(args.socket, model=StubModel(), max_batch=args.max_batch,
+                                           max_wait_ms=args.max_wait_ms).start()
+            rounds, symbols = 200, 20
+            features = np.random.default_rng(0).normal(size=(symbols, 64, 3))
+
+            def worker():
+                client = InferenceClient(args.socket)
+                for _ in range(rounds):
+                    client.predict_batch(features)
+                client.close()
+
+            threads = [threading.Thread(target=worker) for _ in range(args.bench)]
+            t0 = time.perf_counter()
+            for t in threads:
+                t.start()
+            await asyncio.to_thread(lambda: [t.join() for t in threads])
+            elapsed = time.perf_counter() - t0
+            calls = args.bench * rounds
+            print(f"{calls} calls x {symbols} symbols from {args.bench} clients in {elapsed:.2f}s "
+                  f"({1000 * elapsed / calls * args.bench:.2f} ms per call per client); {server.stats()}")
+            await server.stop()
+
+        asyncio.run(bench())
@@ -0,0 +1,494 @@
+"""
+Trade journal (storage/journal.db): the `trades` log, one open
+`position` row per symbol, `equity` snapshots of the portfolio and
+`unresolved_orders`, orders whose outcome on the exchange is unknown and
+must be reconciled by hand.
+
+Writes go through `Journal`, which owns one long-lived WAL connection on
+a background thread and group-commits queued statements. Readers (the
+dashboard, position restore) use their own connections and never wait on
+the writer; `TradeHistory` keeps the dashboard's copy of the trades
+table current without re-reading it.
+"""
+import time
+import queue
+import logging
+import sqlite3
+import threading
+from pathlib import Path
+from datetime import datetime, timedelta, timezone
+
+from bot import metrics
+
+DEFAULT_DB_PATH = Path(__file__).resolve().parents[1] / "storage" / "journal.db"
+
+TRADES_SQL = """CREATE TABLE IF NOT EXISTS trades (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    timestamp TEXT,
+    symbol TEXT,
+    side TEXT,
+    price REAL,
+    qty REAL,
+    fee REAL,
+    pnl REAL
+)"""
+
+POSITION_SQL = """CREATE TABLE IF NOT EXISTS position (
+    symbol TEXT PRIMARY KEY,
+    side TEXT,
+    price REAL,
+    qty REAL,
+    timestamp TEXT
+)"""
+
+EQUITY_SQL = """CREATE TABLE IF NOT EXISTS equity (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER,
+    equity REAL,
+    realized REAL,
+    unrealized REAL,
+    fees REAL,
+    drawdown REAL,
+    daily_drawdown REAL,
+    day_peak REAL,
+    open_positions INTEGER,
+    positions TEXT,
+    last_trade_id INTEGER
+)"""
+
+UNRESOLVED_SQL = """CREATE TABLE IF NOT EXISTS unresolved_orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts INTEGER,
+    timestamp TEXT,
+    symbol TEXT,
+    side TEXT,
+    qty REAL,
+    order_id TEXT,
+    client_order_id TEXT,
+    status TEXT,
+    error TEXT
+)"""
+
+TRADE_COLUMNS = ("timestamp", "ts", "symbol", "side", "price", "qty", "fee", "pnl", "order_id")
+POSITION_COLUMNS = ("symbol", "side", "price", "qty", "timestamp")
+
+INSERT_TRADE = f"INSERT INTO trades ({', '.join(TRADE_COLUMNS)}) VALUES ({', '.join('?' * len(TRADE_COLUMNS))})"
+UPSERT_POSITION = f"INSERT OR REPLACE INTO position ({', '.join(POSITION_COLUMNS)}) VALUES ({', '.join('?' * len(POSITION_COLUMNS))})"
+DELETE_POSITION = "DELETE FROM position WHERE symbol = ?"
+UNRESOLVED_COLUMNS = ("ts", "timestamp", "symbol", "side", "qty", "order_id", "client_order_id", "status", "error")
+INSERT_UNRESOLVED = (f"INSERT INTO unresolved_orders ({', '.join(UNRESOLVED_COLUMNS)}) "
+                     f"VALUES ({', '.join('?' * len(UNRESOLVED_COLUMNS))})")
+SNAPSHOT_COLUMNS = ("ts", "equity", "realized", "unrealized", "fees", "drawdown", "daily_drawdown", "day_peak",
+                    "open_positions", "positions")
+# Queued behind the trades it covers, so MAX(id) is exactly what the snapshot includes.
+INSERT_SNAPSHOT = (f"INSERT INTO equity ({', '.join(SNAPSHOT_COLUMNS)}, last_trade_id) "
+                   f"VALUES ({', '.join('?' * len(SNAPSHOT_COLUMNS))}, (SELECT COALESCE(MAX(id), 0) FROM trades))")
+
+_STOP = object()
+
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_ZONE_SUFFIXES = {
+    "UTC": timezone.utc,
+    "GMT": timezone.utc,
+    "EDT": timezone(timedelta(hours=-4)),
+    "EST": timezone(timedelta(hours=-5)),
+}
+
+
+_LEGACY_FORMATS = ("%a %b %d %H:%M:%S %Y", "%Y-%m-%d %H:%M:%S")
+
+
+def to_epoch_ms(text):
+    """
+    Parse a journal timestamp into epoch milliseconds. Accepts ISO 8601 and
+    the `date`-style strings older rows used ("Fri Sep 26 02:32:24 EDT 2025").
+    Naive values are taken as UTC; returns None when nothing matches.
+    """
+    if text is None:
+        return None
+    parts = str(text).split()
+    zone = timezone.utc
+    for part in parts:
+        if part in _ZONE_SUFFIXES:
+            zone = _ZONE_SUFFIXES[part]
+            parts.remove(part)
+            break
+    s = " ".join(parts)
+    try:
+        dt = datetime.fromisoformat(s)
+    except ValueError:
+        for fmt in _LEGACY_FORMATS:
+            try:
+                dt = datetime.strptime(s, fmt)
+                break
+            except ValueError:
+                continue
+        else:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=zone)
+    return (dt - EPOCH) // timedelta(milliseconds=1)
+
+
+_ZONE_PATTERN = r"\s(" + "|".join(_ZONE_SUFFIXES) + r")\b"
+_ZONE_OFFSET_MS = {name: zone.utcoffset(None) // timedelta(milliseconds=1) for name, zone in _ZONE_SUFFIXES.items()}
+
+
+def parse_timestamps(values):
+    """
+    `to_epoch_ms` over a whole column at once: one vectorized ISO parse,
+    then the legacy formats for whatever is left. Returns a nullable Int64
+    Series aligned with `values`.
+    """
+    import pandas as pd
+
+    text = pd.Series(values, dtype="string").reset_index(drop=True)
+    parsed = pd.to_datetime(text, format="ISO8601", utc=True, errors="coerce")
+    ms = (parsed - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(milliseconds=1)
+    legacy = parsed.isna() & text.notna()
+    if legacy.any():
+        # Only `date`-style leftovers pay for the regex and the extra formats.
+        rest = text[legacy]
+        zone = rest.str.extract(_ZONE_PATTERN, expand=False)
+        rest = rest.str.replace(_ZONE_PATTERN, "", regex=True).str.strip()
+        wall = pd.to_datetime(rest, format="ISO8601", utc=True, errors="coerce")
+        for fmt in _LEGACY_FORMATS:
+            missing = wall.isna()
+            if not missing.any():
+                break
+            wall[missing] = pd.to_datetime(rest[missing], format=fmt, utc=True, errors="coerce")
+        # Zone-suffixed values are wall-clock times in that zone.
+        ms[legacy] = ((wall - pd.Timestamp(0, tz="UTC")) // pd.Timedelta(milliseconds=1)
+                      - zone.map(_ZONE_OFFSET_MS).fillna(0).astype("float64"))
+    return ms.round().astype("Int64")
+
+
+def iso_timestamp(ms):
+    """Canonical journal timestamp: ISO 8601 in UTC, millisecond precision."""
+    return datetime.fromtimestamp(ms / 1000, timezone.utc).isoformat(timespec="milliseconds")
+
+
+def normalize_trade(trade):
+    """
+    Copy of a trade (or position) row with an integer epoch-ms `ts` and
+    the matching canonical `timestamp`, whatever format it arrived in.
+    """
+    row = dict(trade)
+    ts = row.get("ts")
+    if ts is None:
+        ts = to_epoch_ms(row.get("timestamp"))
+    if ts is None:
+        logging.warning(f"Unparseable trade timestamp {row.get('timestamp')!r}, using the write time")
+        ts = time.time() * 1000
+    row["ts"] = int(ts)
+    row["timestamp"] = iso_timestamp(row["ts"])
+    return row
+
+
+def _backfill(con, table, where):
+    """
+    Rewrite `timestamp` of the `table` rows matching `where` in canonical
+    form, filling `ts` for trades that lack it. Runs once per journal, in a
+    migration, so readers only ever see parsed values.
+    """
+    import pandas as pd
+
+    key = "id" if table == "trades" else "symbol"
+    ts = "ts" if table == "trades" else "NULL"
+    df = pd.DataFrame(con.execute(f"SELECT {key}, timestamp, {ts} FROM {table} WHERE {where}").fetchall(),
+                      columns=["key", "timestamp", "ts"])
+    if df.empty:
+        return
+    ms = df["ts"].astype("Int64").fillna(parse_timestamps(df["timestamp"])).dropna()
+    stamps = pd.to_datetime(ms.astype("int64"), unit="ms", utc=True).dt.strftime("%Y-%m-%dT%H:%M:%S.%f").str[:-3] + "+00:00"
+    keys = df["key"][ms.index].tolist()
+    if table == "trades":
+        con.executemany("UPDATE trades SET ts = ?, timestamp = ? WHERE id = ?",
+                        zip(ms.astype("int64").tolist(), stamps.tolist(), keys))
+    else:
+        con.executemany("UPDATE position SET timestamp = ? WHERE symbol = ?", zip(stamps.tolist(), keys))
+
+
+# -------- schema migrations (PRAGMA user_version) --------
+def _migrate_single_position(con):
+    """Older journals allowed one position row (id = 1); key it by symbol."""
+    cols = [r[1] for r in con.execute("PRAGMA table_info(position)")]
+    if "id" not in cols:
+        return
+    con.execute("ALTER TABLE position RENAME TO position_single")
+    con.execute(POSITION_SQL)
+    con.execute("""INSERT OR REPLACE INTO position (symbol, side, price, qty, timestamp)
+        SELECT symbol, side, price, qty, timestamp FROM position_single
+        WHERE symbol IS NOT NULL""")
+    con.execute("DROP TABLE position_single")
+
+
+def _v1_base_tables(con):
+    con.execute(TRADES_SQL)
+    _migrate_single_position(con)
+    con.execute(POSITION_SQL)
+
+
+def _v2_epoch_ts(con):
+    """Integer epoch-ms `ts`, nullable `order_id`, (symbol, ts) index, backfill."""
+    cols = {r[1] for r in con.execute("PRAGMA table_info(trades)")}
+    if "ts" not in cols:
+        con.execute("ALTER TABLE trades ADD COLUMN ts INTEGER")
+    if "order_id" not in cols:
+        con.execute("ALTER TABLE trades ADD COLUMN order_id TEXT")
+    _backfill(con, "trades", "ts IS NULL")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_trades_symbol_ts ON trades (symbol, ts)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_trades_ts ON trades (ts)")
+
+
+def _v3_iso_timestamps(con):
+    """
+    Journals migrated to v2 earlier only got `ts`; rewrite their `date`-style
+    timestamps too, so readers never parse legacy text.
+    """
+    legacy = "timestamp IS NOT NULL AND timestamp NOT LIKE '____-__-__T%'"
+    _backfill(con, "trades", f"ts IS NULL OR ({legacy})")
+    _backfill(con, "position", legacy)
+
+
+def _v4_equity(con):
+    """Portfolio snapshots (bot.portfolio)."""
+    con.execute(EQUITY_SQL)
+    con.execute("CREATE INDEX IF NOT EXISTS idx_equity_ts ON equity (ts)")
+
+
+def _v5_unresolved_orders(con):
+    """Orders that may be live or filled on the exchange without a trade row."""
+    con.execute(UNRESOLVED_SQL)
+
+
+MIGRATIONS = [_v1_base_tables, _v2_epoch_ts, _v3_iso_timestamps, _v4_equity, _v5_unresolved_orders]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def init_db(db_path=DEFAULT_DB_PATH):
+    """Bring the journal up to SCHEMA_VERSION, one transaction per migration."""
+    con = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        while True:
+            con.execute("BEGIN IMMEDIATE")
+            version = con.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                con.execute("COMMIT")
+                return version
+            try:
+                MIGRATIONS[version](con)
+                con.execute(f"PRAGMA user_version = {version + 1}")
+                con.execute("COMMIT")
+            except Exception:
+                con.execute("ROLLBACK")
+                raise
+            logging.info(f"Journal schema migrated to v{version + 1}")
+    finally:
+        con.close()
+
+
+def load_position(con, symbol):
+    con.row_factory = sqlite3.Row
+    row = con.execute("SELECT * FROM position WHERE symbol = ?", (symbol,)).fetchone()
+    return dict(row) if row else None
+
+
+def load_positions(con):
+    con.row_factory = sqlite3.Row
+    return {row["symbol"]: dict(row) for row in con.execute("SELECT * FROM position")}
+
+
+def load_unresolved(con):
+    con.row_factory = sqlite3.Row
+    return [dict(row) for row in con.execute("SELECT * FROM unresolved_orders ORDER BY id")]
+
+
+class TradeHistory:
+    """
+    Read side of the trades table, loaded incrementally.
+
+    Keeps every trade read so far in a DataFrame and, on `frame()`, fetches
+    only rows with an id above the watermark. A persistent connection's
+    `PRAGMA data_version` tells whether anyone committed since the last
+    look, so an unchanged journal costs no query at all. Safe to share
+    between threads (e.g. Streamlit sessions).
+    """
+
+    def __init__(self, db_path=DEFAULT_DB_PATH, min_interval=1.0):
+        self.db_path = Path(db_path)
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._con = None
+        self._inode = None
+        self._reset()
+
+    def _reset(self):
+        self._frame = None
+        self._watermark = 0
+        self._version = None
+        self._checked = 0.0
+
+    def _connection(self):
+        inode = self.db_path.stat().st_ino
+        if self._con is None or inode != self._inode:
+            # First use, or the file was replaced: start over.
+            if self._con is not None:
+                self._con.close()
+            self._con = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._con.execute("PRAGMA query_only=1")
+            self._inode = inode
+            self._reset()
+        return self._con
+
+    def _load(self, con):
+        import pandas as pd
+
+        new = pd.read_sql("SELECT * FROM trades WHERE id > ? ORDER BY id", con, params=[self._watermark])
+        if not new.empty:
+            missing = new["ts"].isna()
+            if missing.any():
+                # Rows from writers that predate `ts`.
+                new["ts"] = new["ts"].astype("Int64")
+                new.loc[missing, "ts"] = parse_timestamps(new.loc[missing, "timestamp"]).to_numpy()
+            new["timestamp"] = pd.to_datetime(new["ts"], unit="ms", utc=True)
+            self._watermark = int(new["id"].iloc[-1])
+        if self._frame is None or self._frame.empty:
+            self._frame = new
+        elif not new.empty:
+            self._frame = pd.concat([self._frame, new], ignore_index=True)
+
+    def frame(self):
+        """Every trade, oldest first; treat the result as read-only."""
+        with self._lock:
+            if not self.db_path.exists():
+                return None
+            now = time.monotonic()
+            if self._frame is not None and now - self._checked < self.min_interval:
+                return self._frame
+            con = self._connection()
+            self._checked = now
+            version = con.execute("PRAGMA data_version").fetchone()[0]
+            if self._frame is None or version != self._version:
+                self._load(con)
+                self._version = version
+            return self._frame
+
+
+class Journal:
+    """
+    Background journal writer.
+
+    Statements are queued by the trading loop and committed in batches of
+    up to `batch_size`, waiting at most `flush_interval` seconds for a batch
+    to fill. With `synchronous=NORMAL` a commit is durable once the WAL is
+    checkpointed, which happens every `checkpoint_interval` seconds and on
+    `close()`; use `synchronous=FULL` to fsync every batch instead.
+    """
+
+    def __init__(self, db_path, batch_size=100, flush_interval=0.05,
+                 synchronous="NORMAL", checkpoint_interval=30.0):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.synchronous = synchronous
+        self.checkpoint_interval = checkpoint_interval
+        self._queue = queue.Queue()
+        init_db(db_path)
+        self._thread = threading.Thread(target=self._run, name="journal-writer", daemon=True)
+        self._thread.start()
+
+    # -------- public API (any thread) --------
+    def append_trade(self, trade):
+        row = normalize_trade(trade)
+        self._queue.put((INSERT_TRADE, tuple(row.get(c) for c in TRADE_COLUMNS)))
+
+    def save_position(self, trade):
+        row = normalize_trade(trade)
+        self._queue.put((UPSERT_POSITION, tuple(row[c] for c in POSITION_COLUMNS)))
+
+    def delete_position(self, symbol):
+        self._queue.put((DELETE_POSITION, (symbol,)))
+
+    def save_snapshot(self, snapshot):
+        self._queue.put((INSERT_SNAPSHOT, tuple(snapshot[c] for c in SNAPSHOT_COLUMNS)))
+
+    def save_unresolved(self, order):
+        row = normalize_trade(order)
+        self._queue.put((INSERT_UNRESOLVED, tuple(row.get(c) for c in UNRESOLVED_COLUMNS)))
+
+    def flush(self):
+        """Block until every queued write has been committed."""
+        self._queue.join()
+
+    def close(self):
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    # -------- writer thread --------
+    def _connect(self):
+        con = sqlite3.connect(self.db_path)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute(f"PRAGMA synchronous={self.synchronous}")
+        con.execute("PRAGMA busy_timeout=5000")
+        return con
+
+    def _next_batch(self):
+        try:
+            first = self._queue.get(timeout=self.checkpoint_interval)
+        except queue.Empty:
+            return []
+        batch = [first]
+        deadline = time.monotonic() + self.flush_interval
+        while batch[-1] is not _STOP and len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _commit(self, con, writes):
+        with metrics.stage("journal_commit"):
+            try:
+                with con:
+                    for sql, params in writes:
+                        con.execute(sql, params)
+            except sqlite3.Error as e:
+                logging.error(f"Journal batch failed ({e}), retrying row by row")
+                metrics.ERRORS.labels("journal").inc()
+                for sql, params in writes:
+                    try:
+                        with con:
+                            con.execute(sql, params)
+                    except sqlite3.Error as e:
+                        logging.error(f"Journal write dropped: {sql} {params}: {e}")
+                        metrics.ERRORS.labels("journal").inc()
+
+    def _run(self):
+        con = self._connect()
+        last_checkpoint = time.monotonic()
+        stop = False
+        while not stop:
+            batch = self._next_batch()
+            stop = any(item is _STOP for item in batch)
+            writes = [item for item in batch if item is not _STOP]
+            if writes:
+                self._commit(con, writes)
+            for _ in batch:
+                self._queue.task_done()
+            if stop or time.monotonic() - last_checkpoint >= self.checkpoint_interval:
+                con.execute("PRAGMA wal_checkpoint(TRUNCATE)" if stop else "PRAGMA wal_checkpoint(PASSIVE)")
+                last_checkpoint = time.monotonic()
+        con.close()
+
+
+if __name__ == "__main__":
+    # One-shot migration/backfill of an existing journal.
+    import sys
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_DB_PATH
+    print(f"{path}: schema v{init_db(path)}")
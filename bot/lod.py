@@ -0,0 +1,147 @@
+"""
+Level-of-detail reduction for price charts.
+
+A chart is only so many pixels wide, so there is no point sending it more
+candles than that. `downsample_ohlc` merges consecutive bars into at most
+`buckets` bars (first open, highest high, lowest low, last close, summed
+volume), so wicks and extremes survive. Lines such as EMAs keep each
+bucket's minimum and maximum, in time order (`downsample_line`), and
+trade markers are thinned to one per bucket and side (`thin_markers`).
+
+Inputs are dicts of column arrays like `CandleSeries.read()` returns;
+`window` slices them by time without copying, so zooming in on a long
+memory-mapped series only touches the visible range. `IndicatorCache`
+keeps whole-series EMAs so a window starts from a warmed-up value.
+"""
+import threading
+import numpy as np
+
+from bot.indicators import ema_series
+
+OHLC_COLUMNS = ("timestamp", "open", "high", "low", "close", "volume")
+
+
+def window(cols, start_ms=None, end_ms=None):
+    """Views of `cols` with start_ms <= timestamp < end_ms."""
+    ts = cols["timestamp"]
+    lo = 0 if start_ms is None else int(np.searchsorted(ts, start_ms, side="left"))
+    hi = len(ts) if end_ms is None else int(np.searchsorted(ts, end_ms, side="left"))
+    return {col: arr[lo:hi] for col, arr in cols.items()}
+
+
+def bucket_starts(n, buckets):
+    """Start index of each of at most `buckets` near-equal runs over n rows."""
+    if n <= buckets:
+        return np.arange(n)
+    return np.unique(np.linspace(0, n, buckets, endpoint=False).astype("int64"))
+
+
+def _segments(values, starts):
+    """(buckets, longest run) index matrix; short runs repeat their last row."""
+    ends = np.r_[starts[1:], len(values)]
+    width = int((ends - starts).max())
+    idx = starts[:, None] + np.arange(width)
+    return np.minimum(idx, (ends - 1)[:, None])
+
+
+def downsample_ohlc(cols, buckets):
+    """Merge bars into at most `buckets` bars, keeping highs and lows."""
+    n = len(cols["timestamp"])
+    if n <= buckets:
+        return {col: np.asarray(cols[col]) for col in OHLC_COLUMNS if col in cols}
+    starts = bucket_starts(n, buckets)
+    last = np.r_[starts[1:] - 1, n - 1]
+    out = {
+        "timestamp": np.asarray(cols["timestamp"])[starts],
+        "open": np.asarray(cols["open"])[starts],
+        "high": np.maximum.reduceat(cols["high"], starts),
+        "low": np.minimum.reduceat(cols["low"], starts),
+        "close": np.asarray(cols["close"])[last],
+    }
+    if "volume" in cols:
+        out["volume"] = np.add.reduceat(cols["volume"], starts)
+    return out
+
+
+def downsample_line(ts, values, buckets):
+    """
+    Reduce a line to at most 2 * `buckets` points: each bucket's minimum
+    and maximum, in the order they occur.
+    """
+    ts = np.asarray(ts)
+    values = np.asarray(values, dtype="float64")
+    if len(values) <= 2 * buckets:
+        return ts, values
+    starts = bucket_starts(len(values), buckets)
+    idx = _segments(values, starts)
+    seg = values[idx]
+    # Leading NaNs (warm-up) must not win argmin/argmax.
+    lo = idx[np.arange(len(idx)), np.argmin(np.where(np.isnan(seg), np.inf, seg), axis=1)]
+    hi = idx[np.arange(len(idx)), np.argmax(np.where(np.isnan(seg), -np.inf, seg), axis=1)]
+    keep = np.unique(np.concatenate([lo, hi]))
+    return ts[keep], values[keep]
+
+
+def thin_markers(ts, sides, start_ms, end_ms, buckets):
+    """
+    Positions of the markers to draw between start_ms and end_ms: all of
+    them when they fit, else the last one per (time bucket, side).
+    """
+    ts = np.asarray(ts, dtype="int64")
+    inside = np.flatnonzero((ts >= start_ms) & (ts < end_ms))
+    if len(inside) <= 2 * buckets:
+        return inside
+    span = max(1, end_ms - start_ms)
+    bucket = (ts[inside] - start_ms) * buckets // span
+    side = (np.asarray(sides)[inside] == "sell").astype("int64")
+    order = np.lexsort((ts[inside], bucket * 2 + side))[::-1]
+    _, first = np.unique((bucket * 2 + side)[order], return_index=True)
+    return np.sort(inside[order[first]])
+
+
+class IndicatorCache:
+    """
+    Whole-series EMAs per (series key, span), recomputed only when the
+    series has changed length or its last timestamp moved.
+    """
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def ema(self, key, cols, span):
+        ts = cols["timestamp"]
+        stamp = (len(ts), int(ts[-1]) if len(ts) else None)
+        with self._lock:
+            hit = self._values.get((key, span))
+            if hit is not None and hit[0] == stamp:
+                return hit[1]
+        values = ema_series(cols["close"], span)
+        with self._lock:
+            self._values[(key, span)] = (stamp, values)
+        return values
+
+
+if __name__ == "__main__":
+    import time
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Time LOD reduction of a synthetic 1m series.")
+    ap.add_argument("--days", type=int, default=365)
+    ap.add_argument("--buckets", type=int, default=1200)
+    args = ap.parse_args()
+
+    n = args.days * 1440
+    rng = np.random.default_rng(0)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.0005, n)))
+    cols = {"timestamp": 1_700_000_000_000 + 60_000 * np.arange(n, dtype="int64"), "open": close,
+            "high": close * 1.0005, "low": close * 0.9995, "close": close, "volume": np.ones(n)}
+    cache = IndicatorCache()
+    t0 = time.perf_counter()
+    fast, slow = cache.ema("bench", cols, 12), cache.ema("bench", cols, 26)
+    t1 = time.perf_counter()
+    bars = downsample_ohlc(cols, args.buckets)
+    lines = [downsample_line(cols["timestamp"], e, args.buckets) for e in (fast, slow)]
+    t2 = time.perf_counter()
+    print(f"{n} bars: EMAs {1000 * (t1 - t0):.1f}ms, reduce to {len(bars['timestamp'])} bars "
+          f"+ {sum(len(t) for t, _ in lines)} line points {1000 * (t2 - t1):.1f}ms")
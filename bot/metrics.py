@@ -0,0 +1,378 @@
+"""
+In-process metrics for the trading loop, served in the Prometheus text format.
+
+Counters, gauges and fixed-bucket histograms live in one REGISTRY and are
+updated in place: an increment or an observation is a lock, an add and (for
+histograms) a bisect over the bucket bounds, so the instrumentation stays on
+in production. Labelled series are created on first use by `labels(...)`
+and kept for the life of the process.
+
+`start_server(host, port)` serves `GET /metrics` from a daemon thread
+(stdlib http.server, imported only then, so recording metrics keeps the
+bot's imports light); scraping never touches the event loop. Gauges can be
+bound to a function with `set_function()` and are then read at scrape time.
+
+The series the bot records:
+
+    bot_stage_seconds{stage}           fetch_ohlcv, indicators, order, step,
+                                       journal_commit, notify, guardian_exit
+    bot_api_calls_total{call}          exchange requests
+    bot_errors_total{where}            trading, api, order, journal, notify
+    bot_orders_total{side,result}      filled / failed / blocked
+    bot_notifications_total{channel,result}  sent / failed / skipped / suppressed /
+                                             disabled / dropped
+    bot_equity, bot_drawdown, bot_open_positions, bot_position_qty{symbol}
+
+    python -m bot.metrics --bench          # cost of one observation
+"""
+import time
+import logging
+import threading
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+
+# Seconds; covers an in-memory indicator update up to a slow exchange round trip.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value):
+    if value == float("inf"):
+        return "+Inf"
+    if value == float("-inf"):
+        return "-Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+class _Metric(ABC):
+    kind = None
+
+    def __init__(self, name, doc, labelnames=()):
+        self.name = name
+        self.doc = doc
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._children[()] = self._child()
+
+    @abstractmethod
+    def _child(self):
+        """A new value holder for one series."""
+
+    def labels(self, *values):
+        """The series for these label values (positional, in `labelnames` order)."""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(tuple(str(v) for v in values), self._child())
+                self._children[values] = child
+        return child
+
+    def _series(self):
+        seen = set()
+        for values, child in list(self._children.items()):
+            if id(child) not in seen:
+                seen.add(id(child))
+                yield tuple(str(v) for v in values), child
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._series(), key=lambda item: item[0]):
+            lines.extend(child.expose(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterValue:
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def expose(self, name, labelnames, values):
+        return [f"{name}{_labels(labelnames, values)} {_format(self.value)}"]
+
+
+class _GaugeValue:
+    def __init__(self):
+        self.value = 0.0
+        self.function = None
+        self._lock = threading.Lock()
+
+    def set(self, value):
+        self.value = float(value)
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1.0):
+        self.inc(-amount)
+
+    def set_function(self, function):
+        """Read the value from `function()` at scrape time instead."""
+        self.function = function
+
+    def get(self):
+        if self.function is None:
+            return self.value
+        try:
+            return float(self.function())
+        except Exception as e:
+            logging.debug(f"Gauge function failed: {e}")
+            return float("nan")
+
+    def expose(self, name, labelnames, values):
+        return [f"{name}{_labels(labelnames, values)} {_format(self.get())}"]
+
+
+class _Timer:
+    __slots__ = ("histogram", "t0")
+
+    def __init__(self, histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.t0)
+
+
+class _HistogramValue:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    def time(self):
+        """Context manager observing the seconds spent in its block."""
+        return _Timer(self)
+
+    def expose(self, name, labelnames, values):
+        with self._lock:
+            counts, total = list(self.counts), self.sum
+        lines, cumulative = [], 0
+        for bound, count in zip((*self.buckets, float("inf")), counts):
+            cumulative += count
+            lines.append(f"{name}_bucket{_labels(labelnames, values, [('le', _format(bound))])} {cumulative}")
+        lines.append(f"{name}_sum{_labels(labelnames, values)} {_format(total)}")
+        lines.append(f"{name}_count{_labels(labelnames, values)} {cumulative}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self):
+        return _CounterValue()
+
+    def inc(self, amount=1):
+        self._children[()].inc(amount)
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def _child(self):
+        return _GaugeValue()
+
+    def set(self, value):
+        self._children[()].set(value)
+
+    def set_function(self, function):
+        self._children[()].set_function(function)
+
+    def clear(self):
+        """Drop every labelled series (e.g. positions that were closed)."""
+        with self._lock:
+            self._children = {} if self.labelnames else {(): self._child()}
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+        super().__init__(name, doc, labelnames)
+
+    def _child(self):
+        return _HistogramValue(self.buckets)
+
+    def observe(self, value):
+        self._children[()].observe(value)
+
+    def time(self):
+        return self._children[()].time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metric {metric.name} already registered")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, doc, labelnames=()):
+        return self.register(Counter(name, doc, labelnames))
+
+    def gauge(self, name, doc, labelnames=()):
+        return self.register(Gauge(name, doc, labelnames))
+
+    def histogram(self, name, doc, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, doc, labelnames, buckets))
+
+    def expose(self):
+        """Every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.expose())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("bot_stage_seconds", "Latency of one trading-loop stage.", ("stage",))
+API_CALLS = REGISTRY.counter("bot_api_calls_total", "Exchange API requests made.", ("call",))
+ERRORS = REGISTRY.counter("bot_errors_total", "Errors caught by the bot, by where they happened.", ("where",))
+ORDERS = REGISTRY.counter("bot_orders_total", "Orders by side and result.", ("side", "result"))
+NOTIFICATIONS = REGISTRY.counter("bot_notifications_total", "Notifications by channel and result.",
+                                 ("channel", "result"))
+EQUITY = REGISTRY.gauge("bot_equity", "Portfolio equity (realized + unrealized).")
+DRAWDOWN = REGISTRY.gauge("bot_drawdown", "Drawdown from the session high-water mark.")
+OPEN_POSITIONS = REGISTRY.gauge("bot_open_positions", "Number of open positions.")
+POSITION_QTY = REGISTRY.gauge("bot_position_qty", "Open quantity per symbol.", ("symbol",))
+STARTED = REGISTRY.gauge("bot_start_time_seconds", "Unix time the runtime started.")
+
+
+def stage(name):
+    """Context manager timing one `bot_stage_seconds` stage."""
+    return STAGE_SECONDS.labels(name).time()
+
+
+def watch_portfolio(portfolio):
+    """Bind the portfolio gauges to `portfolio`; read when scraped."""
+    EQUITY.set_function(lambda: portfolio.equity)
+    DRAWDOWN.set_function(lambda: portfolio.drawdown)
+    OPEN_POSITIONS.set_function(lambda: len(portfolio.positions))
+
+
+def update_positions(portfolio):
+    POSITION_QTY.clear()
+    for symbol, pos in list(portfolio.positions.items()):
+        POSITION_QTY.labels(symbol).set(pos["qty"])
+
+
+def _handler(registry):
+    from http.server import BaseHTTPRequestHandler
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = registry.expose().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # one line per scrape is noise
+
+    return Handler
+
+
+class MetricsServer:
+    def __init__(self, host="127.0.0.1", port=9108, registry=REGISTRY):
+        from http.server import ThreadingHTTPServer
+        self._httpd = ThreadingHTTPServer((host, port), _handler(registry))
+        self._httpd.daemon_threads = True
+        self.address = self._httpd.server_address
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="metrics", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        logging.info(f"Metrics on http://{self.address[0]}:{self.address[1]}/metrics")
+        return self
+
+    def close(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+
+def start_server(host="127.0.0.1", port=9108):
+    """Serve REGISTRY on `host:port`; None (logged) when the port is taken."""
+    try:
+        return MetricsServer(host, port).start()
+    except OSError as e:
+        logging.error(f"Metrics endpoint on {host}:{port} not started: {e}")
+        return None
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Serve or benchmark the bot metrics.")
+    ap.add_argument("--bench", action="store_true", help="time observations instead of serving")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=9108)
+    args = ap.parse_args()
+
+    if args.bench:
+        n = 200_000
+        child = STAGE_SECONDS.labels("bench")
+        counter = API_CALLS.labels("bench")
+        t0 = time.perf_counter()
+        for i in range(n):
+            child.observe(i * 1e-7)
+        t1 = time.perf_counter()
+        for _ in range(n):
+            counter.inc()
+        t2 = time.perf_counter()
+        for _ in range(n):
+            with stage("bench"):
+                pass
+        t3 = time.perf_counter()
+        text = REGISTRY.expose()
+        t4 = time.perf_counter()
+        print(f"observe {1e9 * (t1 - t0) / n:.0f} ns, inc {1e9 * (t2 - t1) / n:.0f} ns, "
+              f"timed stage {1e9 * (t3 - t2) / n:.0f} ns, scrape {1000 * (t4 - t3):.2f} ms ({len(text)} bytes)")
+    else:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+        server = start_server(args.host, args.port)
+        if server is not None:
+            server._thread.join()
@@ -1,47 +1,260 @@
-from bot.config_loader import load_config
-import smtplib
-from email.mime.text import MIMEText
-import requests
+"""
+Email / Telegram alerts.
+
+`notify_email` and `notify_telegram` only enqueue; a background dispatcher
+thread delivers messages over a persistent SMTP session and a pooled
+requests.Session, applies a per-channel rate limit (`max_per_minute`) and
+folds identical messages repeated within `digest_window` seconds into a
+single digest. Messages for a disabled channel are dropped on arrival, and
+each channel's outbox keeps at most OUTBOX_SIZE messages (the oldest are
+dropped first), so a slow or switched-off channel cannot build a backlog.
+
+smtplib/email and requests are imported by the channel that needs them,
+the first time it is enabled, so importing this module stays cheap.
+
+Channel `send()` returns True when delivered, False when it failed and
+None when the channel is off or unconfigured; the dispatcher times each
+delivery as the `notify` stage and counts the results in bot.metrics.
+"""
+import time
+import queue
+import threading
+from collections import deque
+from bot import metrics
+from bot.config_loader import current_config
+
+DEFAULT_RATE = {"email": 6, "telegram": 20}
+DEFAULT_DIGEST_WINDOW = 60
+OUTBOX_SIZE = 100
+_STOP = object()
+
+
+class _TokenBucket:
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = float(max(1, per_minute))
+        self.stamp = time.monotonic()
+
+    def take(self):
+        now = time.monotonic()
+        self.tokens = min(max(1, self.per_minute), self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+
+class _EmailChannel:
+    """Keeps one logged-in SMTP session and reconnects when it drops."""
+
+    def __init__(self):
+        self._smtp = None
+        self._key = None
+
+    def _session(self, server, port, sender, pwd):
+        key = (server, port, sender, pwd)
+        if self._smtp is None or self._key != key:
+            import smtplib
+            self.close()
+            smtp = smtplib.SMTP(server, port, timeout=10)
+            smtp.starttls()
+            smtp.login(sender, pwd)
+            self._smtp, self._key = smtp, key
+        return self._smtp
+
+    def send(self, cfg, subject, body):
+        em = cfg.get("notifications", {}).get("email", {})
+        if not em.get("enabled", False):
+            return None
+        server = em.get("smtp_server")
+        port = em.get("smtp_port")
+        sender = em.get("sender")
+        pwd = em.get("password")
+        recips = em.get("recipients", [])
+        if not (server and sender and pwd and recips):
+            print("⚠️ Email config incomplete")
+            return None
+        import smtplib
+        from email.mime.text import MIMEText
+        msg = MIMEText(body)
+        msg["Subject"] = subject
+        msg["From"] = sender
+        msg["To"] = ", ".join(recips)
+        for attempt in range(2):
+            try:
+                self._session(server, port, sender, pwd).sendmail(sender, recips, msg.as_string())
+                return True
+            except (smtplib.SMTPException, OSError) as e:
+                # The server may have dropped an idle session; retry once on a fresh one.
+                self.close()
+                if attempt:
+                    print("Email notify failed:", e)
+        return False
+
+    def close(self):
+        if self._smtp is not None:
+            import smtplib
+            try:
+                self._smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+        self._smtp = None
+        self._key = None
+
+
+class _TelegramChannel:
+    def __init__(self):
+        self._http = None
+
+    def send(self, cfg, subject, text):
+        tg = cfg.get("notifications", {}).get("telegram", {})
+        if not tg.get("enabled", False):
+            return None
+        token = tg.get("bot_token")
+        chat = tg.get("chat_id")
+        if not (token and chat):
+            print("⚠️ Telegram config incomplete")
+            return None
+        if self._http is None:
+            import requests
+            self._http = requests.Session()
+        url = f"https://api.telegram.org/bot{token}/sendMessage"
+        payload = {"chat_id": chat, "text": text}
+        try:
+            self._http.post(url, data=payload, timeout=5)
+            return True
+        except Exception as e:
+            print("Telegram notify failed:", e)
+            return False
+
+    def close(self):
+        if self._http is not None:
+            self._http.close()
+            self._http = None
+
+
+class NotificationDispatcher:
+    def __init__(self, config_loader=current_config):
+        self.config_loader = config_loader
+        self._queue = queue.Queue()
+        self._channels = {"email": _EmailChannel(), "telegram": _TelegramChannel()}
+        self._outbox = {name: deque(maxlen=OUTBOX_SIZE) for name in self._channels}
+        self._buckets = {}
+        # (channel, subject, body) -> [window_start, suppressed_count]
+        self._recent = {}
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, channel, subject, body):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="notifications", daemon=True)
+                self._thread.start()
+        self._queue.put((channel, subject, body))
+
+    def close(self, timeout=10):
+        with self._lock:
+            thread = self._thread
+        if thread is None:
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+        with self._lock:
+            self._thread = None
+
+    # -------- dispatcher thread --------
+    def _enqueue(self, channel, subject, body):
+        outbox = self._outbox[channel]
+        if len(outbox) == outbox.maxlen:
+            metrics.NOTIFICATIONS.labels(channel, "dropped").inc()
+        outbox.append((subject, body))
+
+    def _accept(self, channel, subject, body, window, now, cfg):
+        if not cfg.get("notifications", {}).get(channel, {}).get("enabled", False):
+            metrics.NOTIFICATIONS.labels(channel, "disabled").inc()
+            return
+        key = (channel, subject, body)
+        seen = self._recent.get(key)
+        if seen is not None and now - seen[0] < window:
+            seen[1] += 1
+            metrics.NOTIFICATIONS.labels(channel, "suppressed").inc()
+            return
+        self._recent[key] = [now, 0]
+        self._enqueue(channel, subject, body)
+
+    def _roll_digests(self, window, now, force=False):
+        for key, (start, count) in list(self._recent.items()):
+            if not force and now - start < window:
+                continue
+            channel, subject, body = key
+            if count:
+                note = f"[{count}x in last {int(now - start)}s]"
+                if subject is None:
+                    self._enqueue(channel, None, f"{note} {body}")
+                else:
+                    self._enqueue(channel, f"{note} {subject}", body)
+                self._recent[key] = [now, 0]
+            else:
+                del self._recent[key]
+
+    def _deliver(self, cfg, force=False):
+        nc = cfg.get("notifications", {})
+        for name, outbox in self._outbox.items():
+            per_minute = nc.get(name, {}).get("max_per_minute", DEFAULT_RATE[name])
+            bucket = self._buckets.get(name)
+            if bucket is None or bucket.per_minute != per_minute:
+                bucket = self._buckets[name] = _TokenBucket(per_minute)
+            while outbox and (force or bucket.take()):
+                subject, body = outbox.popleft()
+                with metrics.stage("notify"):
+                    sent = self._channels[name].send(cfg, subject, body)
+                result = "skipped" if sent is None else "sent" if sent else "failed"
+                metrics.NOTIFICATIONS.labels(name, result).inc()
+                if sent is False:
+                    metrics.ERRORS.labels("notify").inc()
+
+    def _run(self):
+        window = DEFAULT_DIGEST_WINDOW
+        stop = False
+        while not stop:
+            try:
+                items = [self._queue.get(timeout=0.5)]
+            except queue.Empty:
+                items = []
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            now = time.monotonic()
+            cfg = self.config_loader() if items else None
+            for item in items:
+                if item is _STOP:
+                    stop = True
+                else:
+                    self._accept(*item, window, now, cfg)
+            self._roll_digests(window, now, force=stop)
+            if stop or any(self._outbox.values()):
+                cfg = cfg or self.config_loader()
+                window = cfg.get("notifications", {}).get("digest_window", DEFAULT_DIGEST_WINDOW)
+                self._deliver(cfg, force=stop)
+        for channel in self._channels.values():
+            channel.close()
+
+
+DISPATCHER = NotificationDispatcher()
+
 
 def notify_email(subject: str, body: str):
-    cfg = load_config()
-    em = cfg.get("notifications", {}).get("email", {})
-    if not em.get("enabled", False):
-        return
-    server = em.get("smtp_server")
-    port = em.get("smtp_port")
-    sender = em.get("sender")
-    pwd = em.get("password")
-    recips = em.get("recipients", [])
-    if not (server and sender and pwd and recips):
-        print("⚠️ Email config incomplete")
-        return
-    msg = MIMEText(body)
-    msg["Subject"] = subject
-    msg["From"] = sender
-    msg["To"] = ", ".join(recips)
-    try:
-        smtp = smtplib.SMTP(server, port, timeout=10)
-        smtp.starttls()
-        smtp.login(sender, pwd)
-        smtp.sendmail(sender, recips, msg.as_string())
-        smtp.quit()
-    except Exception as e:
-        print("Email notify failed:", e)
+    DISPATCHER.submit("email", subject, body)
+
 
 def notify_telegram(text: str):
-    cfg = load_config()
-    tg = cfg.get("notifications", {}).get("telegram", {})
-    if not tg.get("enabled", False):
-        return
-    token = tg.get("bot_token")
-    chat = tg.get("chat_id")
-    if not (token and chat):
-        print("⚠️ Telegram config incomplete")
-        return
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    payload = {"chat_id": chat, "text": text}
-    try:
-        requests.post(url, data=payload, timeout=5)
-    except Exception as e:
-        print("Telegram notify failed:", e)
+    DISPATCHER.submit("telegram", None, text)
+
+
+def shutdown(timeout=10):
+    """Deliver whatever is still queued (ignoring rate limits) and stop."""
+    DISPATCHER.close(timeout)
@@ -0,0 +1,223 @@
+"""
+Parameter sweep for the `risk` settings of the live strategy.
+
+Candles are copied once into a shared-memory block; every worker process
+attaches to it in its initializer, so tasks only pickle a small parameter
+dict. Workers cache EMA/RSI series per span, which most combinations
+share. Combinations that close fewer than `min_trades` trades are
+dropped (a flat equity curve would otherwise outrank every loser); the
+rest are ranked by Sharpe (desc) then max drawdown (asc), and the winner
+can be written out as a config patch or merged into config.yaml.
+"""
+import os
+import sys
+import random
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory, resource_tracker
+from pathlib import Path
+import numpy as np
+import pandas as pd
+import yaml
+
+from bot.backtest import evaluate, signals_from, to_epoch_ms
+from bot.indicators import ema_series, rsi_series
+
+PARAM_KEYS = ("fast", "slow", "stop_loss", "take_profit", "rsi_buy", "rsi_sell")
+
+DEFAULT_SPACE = {
+    "fast": [5, 8, 12, 16, 20],
+    "slow": [21, 26, 34, 50, 100],
+    "stop_loss": [0.01, 0.02, 0.03],
+    "take_profit": [0.02, 0.04, 0.06],
+    "rsi_buy": [25, 30, 40],
+    "rsi_sell": [60, 70, 75],
+}
+
+
+def grid(space):
+    """Every combination in `space` (dict of key -> list of values)."""
+    keys = list(space)
+    for values in itertools.product(*(space[k] for k in keys)):
+        yield dict(zip(keys, values))
+
+
+def random_search(space, n, seed=None):
+    """
+    `n` random combinations; a (low, high) tuple samples uniformly (ints
+    stay ints), a list samples one of its values.
+    """
+    rng = random.Random(seed)
+    for _ in range(n):
+        params = {}
+        for key, choices in space.items():
+            if isinstance(choices, tuple):
+                low, high = choices
+                params[key] = rng.randint(low, high) if isinstance(low, int) else rng.uniform(low, high)
+            else:
+                params[key] = rng.choice(choices)
+        yield params
+
+
+class SharedCandles:
+    """Epoch-ms timestamps and closes in one shared-memory block."""
+
+    def __init__(self, ts_ms, close):
+        n = len(close)
+        self.n = n
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, 16 * n))
+        ts_view, close_view = _views(self.shm.buf, n)
+        ts_view[:] = ts_ms
+        close_view[:] = close
+
+    @property
+    def spec(self):
+        return self.shm.name, self.n
+
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def _views(buf, n):
+    ts = np.ndarray((n,), dtype=np.int64, buffer=buf, offset=0)
+    close = np.ndarray((n,), dtype=np.float64, buffer=buf, offset=8 * n)
+    return ts, close
+
+
+# -------- worker side --------
+_W = {}
+
+
+def _attach(name, start_method):
+    """
+    Attach to the parent's block without taking over its cleanup: the
+    parent's `unlink()` owns that. Forked workers share the parent's
+    resource tracker, so unregistering there would drop the parent's own
+    registration; spawned ones have their own tracker, which would
+    otherwise unlink the block when they exit.
+    """
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    shm = shared_memory.SharedMemory(name=name)
+    if start_method != "fork":
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+def _init_worker(spec, start_method, qty, fee_rate, slippage):
+    name, n = spec
+    shm = _attach(name, start_method)
+    ts, close = _views(shm.buf, n)
+    _W.update(shm=shm, ts=ts, close=close, qty=qty, fee_rate=fee_rate, slippage=slippage,
+              ema={}, rsi={})
+
+
+def _cached(kind, period):
+    cache = _W[kind]
+    if period not in cache:
+        fn = ema_series if kind == "ema" else rsi_series
+        cache[period] = fn(_W["close"], period)
+    return cache[period]
+
+
+def _evaluate(params):
+    signals = signals_from(_cached("ema", params["fast"]), _cached("ema", params["slow"]),
+                           _cached("rsi", params.get("rsi_period", 14)),
+                           params.get("rsi_buy", 30), params.get("rsi_sell", 70))
+    _, _, stats = evaluate(_W["ts"], _W["close"], params, qty=_W["qty"],
+                           fee_rate=_W["fee_rate"], slippage=_W["slippage"], signals=signals)
+    return {**params, **stats}
+
+
+# -------- driver --------
+def optimize(df, combos, base_risk=None, workers=None, qty=0.001, fee_rate=0.0, slippage=0.0,
+             chunksize=8, min_trades=1):
+    """
+    Backtest every parameter dict in `combos` (merged over `base_risk`)
+    across a process pool. Returns the combinations with at least
+    `min_trades` closed trades as a DataFrame ranked best first.
+    """
+    base = dict(base_risk or {})
+    tasks = [{**base, **c} for c in combos]
+    tasks = [t for t in tasks if t["fast"] < t["slow"]]
+    if not tasks:
+        return pd.DataFrame()
+    candles = SharedCandles(to_epoch_ms(df["timestamp"]), df["close"].to_numpy(dtype="float64"))
+    context = multiprocessing.get_context()
+    try:
+        with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=context,
+                                 initializer=_init_worker,
+                                 initargs=(candles.spec, context.get_start_method(), qty, fee_rate, slippage)) as pool:
+            rows = list(pool.map(_evaluate, tasks, chunksize=chunksize))
+    finally:
+        candles.release()
+    results = pd.DataFrame(rows)
+    results = results[results["trades"] >= min_trades]
+    return results.sort_values(["sharpe", "max_drawdown"], ascending=[False, True], ignore_index=True)
+
+
+def best_patch(results):
+    """Config patch ({"risk": {...}}) for the top-ranked row."""
+    if results.empty:
+        raise ValueError("No parameter combination passed the filters; nothing to patch.")
+    risk = {}
+    for key in PARAM_KEYS:
+        if key in results:
+            value = results[key].iloc[0]
+            risk[key] = value.item() if hasattr(value, "item") else value
+    return {"risk": risk}
+
+
+def write_patch(patch, path):
+    with open(path, "w") as f:
+        yaml.safe_dump(patch, f)
+
+
+def apply_patch(patch, config_path):
+    """Merge `patch` into the YAML at `config_path`, keeping other keys."""
+    config_path = Path(config_path)
+    cfg = {}
+    if config_path.exists():
+        with open(config_path, "r") as f:
+            cfg = yaml.safe_load(f) or {}
+    for section, values in patch.items():
+        cfg.setdefault(section, {}).update(values)
+    tmp = config_path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        yaml.safe_dump(cfg, f)
+    os.replace(tmp, config_path)
+
+
+if __name__ == "__main__":
+    import argparse
+    from bot.config_loader import load_config
+    from bot.datastore import read_candles
+
+    ap = argparse.ArgumentParser(description="Sweep risk parameters over historical candles.")
+    ap.add_argument("source", help="OHLCV CSV with timestamp and close columns, or a symbol in the local store")
+    ap.add_argument("--random", type=int, default=0, help="sample N random combos instead of the full grid")
+    ap.add_argument("--seed", type=int, default=None)
+    ap.add_argument("--workers", type=int, default=None)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--min-trades", type=int, default=1, help="drop combos with fewer closed trades")
+    ap.add_argument("--patch", help="write the best parameters to this YAML file")
+    ap.add_argument("--apply", action="store_true", help="merge the best parameters into config.yaml")
+    args = ap.parse_args()
+
+    cfg = load_config()
+    candles = read_candles(args.source, cfg["exchange_id"], cfg["timeframe"])
+    combos = random_search(DEFAULT_SPACE, args.random, args.seed) if args.random else grid(DEFAULT_SPACE)
+    results = optimize(candles, combos, base_risk=cfg["risk"], workers=args.workers, qty=cfg["trade_qty"],
+                       min_trades=args.min_trades)
+    if results.empty:
+        print(f"No combination closed at least {args.min_trades} trades; config left unchanged.")
+    else:
+        print(results.head(args.top).to_string())
+        patch = best_patch(results)
+        if args.patch:
+            write_patch(patch, args.patch)
+        if args.apply:
+            apply_patch(patch, Path(__file__).resolve().parents[1] / "config" / "config.yaml")
+        print(patch)
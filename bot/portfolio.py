@@ -0,0 +1,195 @@
+"""
+Running portfolio accounting: realized/unrealized PnL, equity, drawdown.
+
+Every fill and every price mark updates the totals in O(1); nothing is
+recomputed from the `trades` table. Positions carry their cost basis
+including entry fees, so a sell realizes `qty * (price - avg_cost)` minus
+its own fee and equity is `starting_equity + realized + unrealized`.
+
+Drawdown is measured from the high-water mark of the session (this
+process) and of the current UTC day. `check_entry()` is the pre-trade
+gate for `cfg["limits"]`.
+
+`snapshot()` rows go to the journal's `equity` table, recording the last
+trade id they include; `restore()` starts from the newest snapshot,
+replays only the trades written after it and then lines its positions up
+with the `position` table.
+"""
+import json
+import time
+import logging
+import sqlite3
+from collections import deque
+
+from bot.journal import load_positions
+
+DAY_MS = 86_400_000
+CURVE_POINTS = 10_000
+
+
+class Portfolio:
+    def __init__(self, starting_equity=10_000.0):
+        self.starting_equity = float(starting_equity)
+        self.positions = {}  # symbol -> {"qty", "avg_cost", "mark"}
+        self.realized = 0.0
+        self.fees = 0.0
+        self.unrealized = 0.0
+        self.curve = deque(maxlen=CURVE_POINTS)
+        self.session_peak = self.starting_equity
+        self.day_peak = self.starting_equity
+        self._day = None
+        self._update()
+
+    @property
+    def equity(self):
+        return self.starting_equity + self.realized + self.unrealized
+
+    @staticmethod
+    def _drawdown(peak, equity):
+        return max(0.0, (peak - equity) / peak) if peak > 0 else 0.0
+
+    @property
+    def drawdown(self):
+        return self._drawdown(self.session_peak, self.equity)
+
+    @property
+    def daily_drawdown(self):
+        return self._drawdown(self.day_peak, self.equity)
+
+    def _update(self, ts=None):
+        ts = int(time.time() * 1000) if ts is None else ts
+        equity = self.equity
+        day = ts // DAY_MS
+        if day != self._day:
+            self._day = day
+            self.day_peak = equity
+        self.session_peak = max(self.session_peak, equity)
+        self.day_peak = max(self.day_peak, equity)
+        return ts, equity
+
+    def mark(self, symbol, price, ts=None):
+        """Revalue the position in `symbol` at `price`."""
+        pos = self.positions.get(symbol)
+        if pos is None:
+            return
+        price = float(price)
+        self.unrealized += pos["qty"] * (price - pos["mark"])
+        pos["mark"] = price
+        self._update(ts)
+
+    def apply_fill(self, trade):
+        """Book a fill (Broker trade dict); returns the realized PnL, net of fees."""
+        symbol, side = trade["symbol"], trade["side"].lower()
+        qty, price = float(trade["qty"]), float(trade["price"])
+        fee = float(trade.get("fee") or 0.0)
+        self.fees += fee
+        pos = self.positions.get(symbol)
+        pnl = 0.0
+        if side == "buy":
+            if pos is None:
+                pos = self.positions[symbol] = {"qty": 0.0, "avg_cost": 0.0, "mark": price}
+            else:
+                self.unrealized -= pos["qty"] * (pos["mark"] - pos["avg_cost"])
+            total = pos["qty"] + qty
+            pos["avg_cost"] = (pos["qty"] * pos["avg_cost"] + qty * price + fee) / total
+            pos["qty"] = total
+            pos["mark"] = price
+            self.unrealized += total * (price - pos["avg_cost"])
+        elif pos is None:
+            logging.warning(f"[{symbol}] Sell of {qty} with no open position; booking the fee only")
+            pnl = -fee
+        else:
+            closed = min(qty, pos["qty"])
+            self.unrealized -= pos["qty"] * (pos["mark"] - pos["avg_cost"])
+            pnl = closed * (price - pos["avg_cost"]) - fee
+            pos["qty"] -= closed
+            if pos["qty"] <= 1e-12:
+                del self.positions[symbol]
+            else:
+                pos["mark"] = price
+                self.unrealized += pos["qty"] * (price - pos["avg_cost"])
+        self.realized += pnl
+        ts, equity = self._update(trade.get("ts"))
+        self.curve.append((ts, equity))
+        return pnl
+
+    def check_entry(self, symbol, limits):
+        """Why a new entry in `symbol` is not allowed under `limits`, or None."""
+        limits = limits or {}
+        max_open = limits.get("max_open_trades")
+        if max_open is not None and symbol not in self.positions and len(self.positions) >= max_open:
+            return f"{len(self.positions)} open positions (max {max_open})"
+        max_daily = limits.get("max_daily_dd")
+        if max_daily is not None and self.daily_drawdown >= max_daily:
+            return f"daily drawdown {self.daily_drawdown:.2%} (max {max_daily:.2%})"
+        max_session = limits.get("max_session_dd")
+        if max_session is not None and self.drawdown >= max_session:
+            return f"session drawdown {self.drawdown:.2%} (max {max_session:.2%})"
+        return None
+
+    def snapshot(self, ts=None):
+        """Row for the journal's `equity` table."""
+        ts, equity = self._update(ts)
+        return {
+            "ts": ts,
+            "equity": equity,
+            "realized": self.realized,
+            "unrealized": self.unrealized,
+            "fees": self.fees,
+            "drawdown": self.drawdown,
+            "daily_drawdown": self.daily_drawdown,
+            "day_peak": self.day_peak,
+            "open_positions": len(self.positions),
+            "positions": json.dumps({s: [p["qty"], p["avg_cost"]] for s, p in self.positions.items()}),
+        }
+
+    def restore(self, con):
+        """Resume from the newest snapshot in `con`, then replay newer trades."""
+        con.row_factory = sqlite3.Row
+        row = con.execute("SELECT * FROM equity ORDER BY id DESC LIMIT 1").fetchone()
+        after = 0
+        if row is not None:
+            self.realized = row["realized"]
+            self.fees = row["fees"]
+            self.positions = {s: {"qty": q, "avg_cost": c, "mark": c}
+                              for s, (q, c) in json.loads(row["positions"] or "{}").items()}
+            self.unrealized = 0.0
+            after = row["last_trade_id"] or 0
+            self.session_peak = self.equity
+            if row["ts"] // DAY_MS == int(time.time() * 1000) // DAY_MS:
+                self._day = row["ts"] // DAY_MS
+                self.day_peak = max(row["day_peak"] or 0.0, self.equity)
+        replayed = 0
+        for trade in con.execute("SELECT * FROM trades WHERE id > ? ORDER BY id", (after,)):
+            self.apply_fill(dict(trade))
+            replayed += 1
+        self._reconcile(load_positions(con))
+        # Restored equity is where this session starts.
+        self.session_peak = self.equity
+        self._update()
+        logging.info(f"Portfolio restored: equity {self.equity:.2f}, {len(self.positions)} open, "
+                     f"{replayed} trades replayed")
+        return replayed
+
+    def _reconcile(self, rows):
+        """The `position` table is what the traders will act on; follow it."""
+        for symbol in set(self.positions) - set(rows):
+            logging.warning(f"[{symbol}] Portfolio position not in the journal, dropping it")
+            pos = self.positions.pop(symbol)
+            self.unrealized -= pos["qty"] * (pos["mark"] - pos["avg_cost"])
+        for symbol, row in rows.items():
+            if symbol not in self.positions:
+                logging.warning(f"[{symbol}] Journal position unknown to the portfolio, adopting it at cost")
+                price = float(row["price"])
+                self.positions[symbol] = {"qty": float(row["qty"]), "avg_cost": price, "mark": price}
+
+    def stats(self):
+        return {
+            "equity": self.equity,
+            "realized": self.realized,
+            "unrealized": self.unrealized,
+            "fees": self.fees,
+            "drawdown": self.drawdown,
+            "daily_drawdown": self.daily_drawdown,
+            "open_positions": len(self.positions),
+        }
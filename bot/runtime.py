@@ -0,0 +1,453 @@
+"""
+Asyncio runtime that trades many symbols from one process.
+
+Each symbol in `cfg["symbols"]` (or the single `cfg["symbol"]`) gets its
+own task, SignalEngine and position row; all tasks share one AsyncBroker
+and its rate limiter.
+
+With `market_data.mode: stream` candles are built from a trade stream
+(bot.stream) instead of REST polling and every bar close wakes the
+symbol's task. Stop-loss/take-profit exits are handled between bars by
+the PositionGuardian (bot.guardian).
+
+Tasks sleep until the next bar close of `cfg["timeframe"]` (plus a short
+settle delay for the exchange to publish the bar) instead of polling on a
+fixed interval. The kill flag and SIGTERM stop the runtime through events.
+
+Fills are booked in a shared Portfolio (bot.portfolio), which prices the
+trade's PnL, enforces `cfg["limits"]` before entries and is snapshotted
+to the journal on every fill and every `portfolio.snapshot_interval`.
+
+Stage latencies, API/order/error counters and the portfolio gauges are
+recorded in bot.metrics and served on `metrics.host:metrics.port` while
+the runtime runs (`metrics.enabled`).
+"""
+import time
+import signal
+import asyncio
+import logging
+import sqlite3
+import threading
+
+from bot import exchanges, metrics
+from bot.broker import CANDLES, AsyncBroker
+from bot.config_loader import config_service, watch_path
+from bot.datastore import OHLCVStore
+from bot.guardian import PositionGuardian
+from bot.indicators import SignalEngine
+from bot.journal import Journal, load_position
+from bot.portfolio import Portfolio
+from bot import notifications
+from bot.notifications import notify_email, notify_telegram
+from bot.stream import CcxtProSource, MarketStream, ReplaySource, timeframe_ms
+
+BAR_SETTLE = 2.0
+FLAG_POLL_INTERVAL = 1.0
+
+
+def symbols_from(cfg):
+    return list(dict.fromkeys(cfg.get("symbols") or [cfg["symbol"]]))
+
+
+def notify(subject, body, text):
+    notify_email(subject, body)
+    notify_telegram(text)
+
+
+def until_bar_close(timeframe, now=None):
+    """Seconds from `now` (epoch seconds) to the next bar boundary of `timeframe`."""
+    bar = timeframe_ms(timeframe) / 1000
+    now = time.time() if now is None else now
+    return bar - now % bar
+
+
+class SymbolTrader:
+    def __init__(self, runtime, symbol):
+        self.runtime = runtime
+        self.symbol = symbol
+        self.engine = None
+        self._generation = None
+        self.wake = asyncio.Event()
+        self._lock = asyncio.Lock()
+        runtime.journal.flush()
+        with sqlite3.connect(runtime.db_path) as con:
+            self.position = load_position(con, symbol)
+        if self.position:
+            logging.info(f"Restored position: {self.position}")
+
+    async def _order(self, side, qty, price):
+        with metrics.stage("order"):
+            trade = await self.runtime.broker.place_order(self.symbol, side, qty, price)
+        metrics.ORDERS.labels(side, "failed" if trade is None else "filled").inc()
+        return trade
+
+    def _order_failed(self, side):
+        logging.error(f"[{self.symbol}] {side.upper()} order failed")
+        notify("Order Failed", f"{side} {self.symbol}", f"{side.upper()} {self.symbol} order failed")
+
+    async def _exit(self, price):
+        """Sell the position; returns the trade, or None if the order failed."""
+        rt = self.runtime
+        trade = await self._order("sell", float(self.position["qty"]), price)
+        if trade is None:
+            self._order_failed("sell")
+            return None
+        rt.record_fill(trade)
+        rt.journal.delete_position(self.symbol)
+        self.position = None
+        return trade
+
+    def exit_levels(self):
+        """(stop_price, target_price) for the open position."""
+        risk = self.runtime.cfg["risk"]
+        entry_price = float(self.position["price"])
+        return entry_price * (1 - risk["stop_loss"]), entry_price * (1 + risk["take_profit"])
+
+    async def _check_exits(self, price):
+        """Close the position at `price` if it crossed SL/TP; returns True if it did."""
+        entry_price = float(self.position["price"])
+        stop_price, target_price = self.exit_levels()
+
+        # Stop-loss condition
+        if price <= stop_price:
+            trade = await self._exit(price)
+            if trade is None:
+                return False
+            logging.warning(f"[{self.symbol}] STOP LOSS triggered at {price:.2f}, entry was {entry_price:.2f}")
+            notify("STOP LOSS", str(trade), f"STOP LOSS {self.symbol} at {price:.2f} (entry {entry_price:.2f})")
+            return True
+
+        # Take-profit condition
+        if price >= target_price:
+            trade = await self._exit(price)
+            if trade is None:
+                return False
+            logging.info(f"[{self.symbol}] TAKE PROFIT triggered at {price:.2f}, entry was {entry_price:.2f}")
+            notify("TAKE PROFIT", str(trade), f"TAKE PROFIT {self.symbol} at {price:.2f} (entry {entry_price:.2f})")
+            return True
+        return False
+
+    async def on_price(self, price):
+        """SL/TP check at `price` without touching indicators; True if it exited."""
+        async with self._lock:
+            return self.position is not None and await self._check_exits(price)
+
+    async def step(self):
+        async with self._lock:
+            with metrics.stage("step"):
+                return await self._step()
+
+    async def _step(self):
+        """Evaluate one tick; returns True when the next tick should run immediately."""
+        rt, cfg = self.runtime, self.runtime.cfg
+        if self._generation != rt.generation:
+            self.engine = SignalEngine(fast=cfg["risk"]["fast"], slow=cfg["risk"]["slow"], rsi_period=14)
+            self._generation = rt.generation
+
+        with metrics.stage("fetch_ohlcv"):
+            df = await rt.broker.fetch_ohlcv(self.symbol, cfg["timeframe"], limit=200)
+        if len(df) < 2:
+            # A freshly started stream has not built two bars yet.
+            return False
+        with metrics.stage("indicators"):
+            last, prev = self.engine.feed(df)
+        price = float(last["close"])
+        rt.portfolio.mark(self.symbol, price)
+
+        rsi_buy = cfg["risk"].get("rsi_buy", 30)
+        rsi_sell = cfg["risk"].get("rsi_sell", 70)
+
+        # If there is an open position, manage it
+        if self.position is not None:
+            stop_price, target_price = self.exit_levels()
+            logging.info(f"[{self.symbol}] Monitoring position: entry={float(self.position['price']):.2f}, price={price:.2f}, TP={target_price:.2f}, SL={stop_price:.2f}")
+            if await self._check_exits(price):
+                return True
+
+        # Entry condition (buy)
+        if prev["signal"] == 0 and last["signal"] == 1 and last["rsi"] < rsi_buy and self.position is None:
+            blocked = rt.portfolio.check_entry(self.symbol, cfg.get("limits"))
+            if blocked:
+                logging.warning(f"[{self.symbol}] BUY signal skipped: {blocked}")
+                metrics.ORDERS.labels("buy", "blocked").inc()
+                return False
+            trade = await self._order("buy", cfg["trade_qty"], price)
+            if trade is None:
+                self._order_failed("buy")
+                return False
+            rt.record_fill(trade)
+            rt.journal.save_position(trade)
+            self.position = trade
+            logging.info(f"[{self.symbol}] BUY at {trade['price']} | RSI: {last['rsi']:.2f}")
+            notify("Trade BUY", str(trade), f"BUY {self.symbol} @ {trade['price']:.2f} | RSI: {last['rsi']:.2f}")
+
+        # Exit condition (sell on reverse signal)
+        elif prev["signal"] == 1 and last["signal"] == 0 and last["rsi"] > rsi_sell and self.position is not None:
+            trade = await self._exit(price)
+            if trade is None:
+                return False
+            logging.info(f"[{self.symbol}] SELL at {trade['price']} | RSI: {last['rsi']:.2f}")
+            notify("Trade SELL", str(trade), f"SELL {self.symbol} @ {trade['price']:.2f} | RSI: {last['rsi']:.2f}")
+
+        return False
+
+    async def _wait(self):
+        """
+        Sleep until the next bar close. Streams wake us on their own bar
+        close; the timeout is the fallback for a quiet stream and the
+        schedule for REST polling.
+        """
+        delay = until_bar_close(self.runtime.cfg["timeframe"]) + BAR_SETTLE
+        try:
+            await asyncio.wait_for(self.wake.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        self.runtime.traders[self.symbol] = self
+        try:
+            if self.runtime.stream is not None:
+                await self.runtime.stream_symbol(self.symbol)
+            while True:
+                again = False
+                self.wake.clear()
+                try:
+                    again = await self.step()
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logging.error(f"[{self.symbol}] Trading error: {e}")
+                    metrics.ERRORS.labels("trading").inc()
+                    notify("Bot Error", f"{self.symbol}: {e}", f"Error ({self.symbol}): {e}")
+                if not again:
+                    await self._wait()
+        finally:
+            if self.runtime.traders.get(self.symbol) is self:
+                del self.runtime.traders[self.symbol]
+
+
+class Runtime:
+    BROKER_KEYS = ("exchange_id", "mode", "rate_limit", "execution", "sim")
+    ENGINE_KEYS = ("risk.fast", "risk.slow", "timeframe")
+    SYMBOL_KEYS = ("symbol", "symbols")
+    STREAM_KEYS = ("market_data", "timeframe", "exchange_id")
+
+    def __init__(self, config_path, db_path, kill_flag):
+        self.config = config_service(config_path)
+        self.db_path = db_path
+        self.kill_flag = kill_flag
+        self.generation = 0
+        self.broker = None
+        self.journal = None
+        self.tasks = {}
+        self.traders = {}
+        self.guardian = None
+        self.stream = None
+        self._stream_tasks = []
+        self._subscriptions = []
+        self._background = set()
+        self.portfolio = None
+        self._stopping = None
+        self._loop = None
+
+    @property
+    def cfg(self):
+        return self.config.snapshot
+
+    def _build_broker(self):
+        old, self.broker = self.broker, AsyncBroker(
+            exchange_id=self.cfg.get("exchange_id"), mode=self.cfg.get("mode"), limiter=exchanges.limiter_for(self.cfg),
+            stream=self.stream, execution=dict(self.cfg.get("execution", {})), sim=dict(self.cfg.get("sim", {})),
+            on_unresolved=self._unresolved_order)
+        return old
+
+    def _unresolved_order(self, order):
+        logging.error(f"[{order['symbol']}] Order {order['order_id'] or order['client_order_id']} needs "
+                      f"reconciling ({order['status']}); recorded in unresolved_orders")
+        self.journal.save_unresolved(order)
+        notify("Order Needs Reconciling", str(order), f"{order['side'].upper()} {order['symbol']} order "
+               f"{order['order_id'] or order['client_order_id']} state unknown, check the exchange")
+
+    def _on_broker_change(self, old_cfg, new_cfg):
+        old = self._build_broker()
+        logging.info(f"Broker rebuilt for {new_cfg.get('exchange_id')} in {new_cfg.get('mode')}")
+        self.spawn(old.close())
+
+    def _on_engine_change(self, old_cfg, new_cfg):
+        self.generation += 1
+
+    # -------- streaming market data --------
+    async def stream_symbol(self, symbol):
+        """Add `symbol` to the stream, seeded with REST history from the exchange."""
+        seed = None
+        if self.broker.exchange is not None:
+            try:
+                await self.broker.limiter.acquire()
+                seed = await self.broker.candles.aupdate(self.broker.exchange, symbol, self.cfg["timeframe"], limit=200)
+            except Exception as e:
+                logging.error(f"[{symbol}] Stream seed failed: {e}")
+        if self.stream is not None:
+            self.stream.add(symbol, seed)
+
+    async def _route(self, events):
+        while True:
+            kind, symbol, *data = await events.get()
+            if kind == "trade":
+                self.guardian.check(symbol, data[1], time.perf_counter())
+            elif symbol in self.traders:
+                self.traders[symbol].wake.set()
+
+    def _start_stream(self):
+        md = self.cfg.get("market_data", {})
+        if md.get("mode", "poll") != "stream":
+            return
+        if md.get("source", "replay") == "exchange":
+            source = CcxtProSource(self.cfg.get("exchange_id"))
+        else:
+            source = ReplaySource(md.get("host", "127.0.0.1"), md.get("port", 8765))
+        self.stream = MarketStream(source, self.cfg["timeframe"])
+        self._stream_tasks = [
+            asyncio.create_task(self.stream.run(), name="stream"),
+            asyncio.create_task(self._route(self.stream.subscribe()), name="stream:route"),
+        ]
+        for symbol in self.traders:
+            self.spawn(self.stream_symbol(symbol))
+        logging.info(f"Streaming market data from {md.get('source', 'replay')}")
+
+    async def _stop_stream(self):
+        for task in self._stream_tasks:
+            task.cancel()
+        await asyncio.gather(*self._stream_tasks, return_exceptions=True)
+        self._stream_tasks = []
+        self.stream = None
+
+    async def _restart_stream(self):
+        await self._stop_stream()
+        self._start_stream()
+        if self.broker is not None:
+            self.broker.stream = self.stream
+
+    def _on_stream_change(self, old_cfg, new_cfg):
+        self.spawn(self._restart_stream())
+
+    # -------- accounting --------
+    def record_fill(self, trade):
+        """Book `trade` in the portfolio (setting its net `pnl`) and journal it."""
+        trade["pnl"] = self.portfolio.apply_fill(trade)
+        self.journal.append_trade(trade)
+        self.journal.save_snapshot(self.portfolio.snapshot(trade.get("ts")))
+        metrics.update_positions(self.portfolio)
+        return trade
+
+    async def _snapshots(self, interval):
+        while True:
+            await asyncio.sleep(interval)
+            self.journal.save_snapshot(self.portfolio.snapshot())
+
+    def spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _subscribe(self, keys, handler):
+        # ConfigService calls back from its watcher thread; hop onto the loop.
+        loop = asyncio.get_running_loop()
+        callback = self.config.subscribe(
+            lambda old, new: loop.call_soon_threadsafe(handler, old, new), keys=keys)
+        self._subscriptions.append(callback)
+
+    def sync_tasks(self):
+        wanted = symbols_from(self.cfg)
+        for symbol in list(self.tasks):
+            if symbol not in wanted:
+                self.tasks.pop(symbol).cancel()
+                if self.stream is not None:
+                    self.stream.remove(symbol)
+                logging.info(f"Stopped trading {symbol}")
+        for symbol in wanted:
+            if symbol not in self.tasks:
+                trader = SymbolTrader(self, symbol)
+                self.tasks[symbol] = asyncio.create_task(trader.run(), name=f"trader:{symbol}")
+                logging.info(f"Started trading {symbol}")
+        self.guardian.refresh(lambda symbol: SymbolTrader(self, symbol))
+
+    def stop(self):
+        """Ask `run()` to shut down; safe to call from any thread."""
+        if self._stopping is not None:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+
+    async def run(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        watch_stop = threading.Event()
+        jc = self.cfg.get("journal", {})
+        self.journal = Journal(
+            self.db_path,
+            batch_size=jc.get("batch_size", 100),
+            flush_interval=jc.get("flush_interval", 0.05),
+            synchronous=jc.get("synchronous", "NORMAL"),
+            checkpoint_interval=jc.get("checkpoint_interval", 30),
+        )
+        pc = self.cfg.get("portfolio", {})
+        self.portfolio = Portfolio(pc.get("starting_equity", 10_000.0))
+        with sqlite3.connect(self.db_path) as con:
+            self.portfolio.restore(con)
+        metrics.watch_portfolio(self.portfolio)
+        metrics.update_positions(self.portfolio)
+        mc = self.cfg.get("metrics", {})
+        metrics_server = None
+        if mc.get("enabled", True):
+            metrics.STARTED.set(time.time())
+            metrics_server = metrics.start_server(mc.get("host", "127.0.0.1"), mc.get("port", 9108))
+        if self.cfg.get("datastore", {}).get("enabled", True):
+            CANDLES.lake = OHLCVStore()
+        self._start_stream()
+        self._build_broker()
+        self._subscribe(self.BROKER_KEYS, self._on_broker_change)
+        self._subscribe(self.ENGINE_KEYS, self._on_engine_change)
+        self._subscribe(self.SYMBOL_KEYS, lambda old, new: self.sync_tasks())
+        self._subscribe(self.STREAM_KEYS, self._on_stream_change)
+        symbols = symbols_from(self.cfg)
+        logging.info(f"Bot started in {self.cfg.get('mode')} on {', '.join(symbols)}")
+        notify("Bot Started", str(self.cfg), f"Bot started: {', '.join(symbols)} in mode {self.cfg.get('mode')}")
+        gc = self.cfg.get("guardian", {})
+        self.guardian = PositionGuardian(
+            self, interval=gc.get("interval", 1.0), latency_budget_ms=gc.get("latency_budget_ms", 250))
+        self.sync_tasks()
+        guard = asyncio.create_task(self.guardian.run(), name="guardian")
+        snapshots = asyncio.create_task(self._snapshots(pc.get("snapshot_interval", 60)), name="snapshots")
+        watch_path(self.kill_flag, self.stop, watch_stop, FLAG_POLL_INTERVAL)
+        try:
+            self._loop.add_signal_handler(signal.SIGTERM, self._stopping.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # not on Windows or outside the main thread
+        try:
+            await self._stopping.wait()
+            if self.kill_flag.exists():
+                logging.info("Kill flag detected, exiting.")
+                notify("Bot Stopped", "Kill flag triggered", "Bot stopped")
+            else:
+                logging.info("Stop requested, exiting.")
+                notify("Bot Stopped", "Stop requested", "Bot stopped")
+        finally:
+            watch_stop.set()
+            guard.cancel()
+            snapshots.cancel()
+            try:
+                self._loop.remove_signal_handler(signal.SIGTERM)
+            except (NotImplementedError, RuntimeError):
+                pass
+            for callback in self._subscriptions:
+                self.config.unsubscribe(callback)
+            for task in self.tasks.values():
+                task.cancel()
+            await asyncio.gather(*self.tasks.values(), return_exceptions=True)
+            self.tasks.clear()
+            await self._stop_stream()
+            await self.broker.close()
+            await exchanges.close_all()
+            self.journal.save_snapshot(self.portfolio.snapshot())
+            await asyncio.to_thread(self.journal.close)
+            await asyncio.to_thread(notifications.shutdown)
+            if metrics_server is not None:
+                await asyncio.to_thread(metrics_server.close)
@@ -0,0 +1,185 @@
+"""
+Sentiment scores served from memory, refreshed in the background.
+
+News sentiment moves over minutes to hours, so `SentimentService.score()`
+never calls out: it returns the cached value (stale-while-revalidate),
+and an entry older than `ttl` is re-fetched on a worker thread while the
+old score keeps being served. Entries older than `max_stale` are dropped
+rather than served. The cache is an LRU of `max_size` symbols.
+
+Symbols passed to `track()` are refreshed on a schedule by a background
+thread, so they rarely go stale at all. Scores are written to
+`storage/sentiment.json` after each refresh round and on `stop()`, and
+loaded on start, so a restart begins warm. A refresh round waits at most
+`fetch_timeout` seconds, and `stop()` does not wait for a scorer stuck in
+a network call.
+"""
+import os
+import json
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+DEFAULT_PATH = Path(__file__).resolve().parents[1] / "storage" / "sentiment.json"
+STOP_TIMEOUT = 5.0
+
+
+class SentimentService:
+    def __init__(self, scorer, ttl=300.0, max_stale=6 * 3600.0, max_size=512, refresh_interval=60.0,
+                 path=DEFAULT_PATH, workers=4, default=0, fetch_timeout=30.0):
+        self.scorer = scorer
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.max_size = max_size
+        self.refresh_interval = refresh_interval
+        self.path = Path(path) if path else None
+        self.default = default
+        self.fetch_timeout = fetch_timeout
+        self._entries = OrderedDict()  # symbol -> (score, fetched_at epoch seconds)
+        self._tracked = set()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix="sentiment")
+        self._stop = threading.Event()
+        self._thread = None
+        self.load()
+
+    # -------- reads (any thread, never blocks on the scorer) --------
+    def _get(self, symbol, now):
+        entry = self._entries.get(symbol)
+        if entry is None:
+            return None
+        if now - entry[1] > self.max_stale:
+            del self._entries[symbol]
+            return None
+        self._entries.move_to_end(symbol)
+        return entry
+
+    def score(self, symbol):
+        """Cached score for `symbol` (`default` if unknown); schedules a refresh when stale."""
+        now = time.time()
+        with self._lock:
+            entry = self._get(symbol, now)
+        if entry is None or now - entry[1] > self.ttl:
+            self.refresh(symbol)
+        return self.default if entry is None else entry[0]
+
+    def scores(self, symbols):
+        return {symbol: self.score(symbol) for symbol in symbols}
+
+    def ensure(self, symbols, timeout=None):
+        """
+        Block (up to `timeout` seconds) only for symbols with no usable score
+        yet, fetching them concurrently; stale ones are revalidated in the
+        background as usual.
+        """
+        now = time.time()
+        with self._lock:
+            missing = [s for s in symbols if self._get(s, now) is None]
+        futures = [f for f in (self.refresh(s) for s in missing) if f is not None]
+        if futures:
+            wait(futures, timeout)
+
+    # -------- refresh --------
+    def _fetch(self, symbol):
+        try:
+            score = self.scorer(symbol)
+        except Exception as e:
+            logging.error(f"[{symbol}] Sentiment refresh failed: {e}")
+            return None
+        with self._lock:
+            self._entries[symbol] = (score, time.time())
+            self._entries.move_to_end(symbol)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return score
+
+    def refresh(self, symbol):
+        """Start fetching `symbol` unless a fetch is already running; returns its future."""
+        with self._lock:
+            future = self._inflight.get(symbol)
+            if future is not None:
+                return future
+            future = self._inflight[symbol] = self._pool.submit(self._fetch, symbol)
+        future.add_done_callback(lambda _: self._done(symbol, future))
+        return future
+
+    def _done(self, symbol, future):
+        with self._lock:
+            if self._inflight.get(symbol) is future:
+                del self._inflight[symbol]
+
+    def track(self, symbols):
+        """Keep `symbols` refreshed by the background thread."""
+        with self._lock:
+            self._tracked.update(symbols)
+
+    def untrack(self, symbols):
+        with self._lock:
+            self._tracked.difference_update(symbols)
+
+    def _due(self):
+        # Refresh ahead of expiry so tracked symbols are served fresh.
+        horizon = time.time() - max(0.0, self.ttl - self.refresh_interval)
+        with self._lock:
+            return [s for s in self._tracked if s not in self._entries or self._entries[s][1] <= horizon]
+
+    def _run(self):
+        while not self._stop.is_set():
+            futures = [self.refresh(s) for s in self._due()]
+            if futures:
+                # Slow fetches finish in the background and are picked up next round.
+                wait(futures, self.fetch_timeout)
+                self.save()
+            self._stop.wait(self.refresh_interval)
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sentiment-refresh", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                logging.warning("Sentiment refresh thread still busy, not waiting for it")
+            self._thread = None
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.save()
+
+    # -------- persistence --------
+    def load(self):
+        if self.path is None:
+            return
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        with self._lock:
+            for symbol, (score, fetched_at) in sorted(data.items(), key=lambda kv: kv[1][1]):
+                if now - fetched_at <= self.max_stale:
+                    self._entries[symbol] = (score, fetched_at)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            data = dict(self._entries)
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, "w") as f:
+                json.dump(data, f)
+            os.replace(tmp, self.path)
+        except (OSError, TypeError, ValueError) as e:
+            logging.warning(f"Could not save sentiment cache: {e}")
@@ -0,0 +1,264 @@
+"""
+Simulated exchange for paper trading and load tests.
+
+SimMarket produces a price path per symbol on a fixed tick grid:
+- "gbm": geometric Brownian motion with annualized `mu` and `sigma`;
+- "bootstrap": block bootstrap of recorded log returns;
+- "replay": the recorded log returns in order, cycling at the end.
+
+Paths are generated in vectorized chunks with NumPy. Each symbol has its
+own generator seeded from (seed, symbol), so a run is reproducible no
+matter in which order symbols are requested. Bars before the start of
+the simulation come from a GBM history that ends at the first tick, so
+indicators have something to warm up on.
+
+SimExchange puts the FakeExchange order API on top of a SimMarket. It
+quotes a spread around the mid price, adds size-dependent market impact,
+samples ack/fill latency (and fills at the price reached after it), and
+charges a taker fee. It also serves fetch_ohlcv/fetch_ticker, so
+AsyncBroker can run against it like against a live exchange.
+"""
+import time
+import zlib
+import asyncio
+import numpy as np
+
+from bot.fake_exchange import FakeExchange
+from bot.stream import timeframe_ms
+
+YEAR_MS = 365 * 86_400_000
+CHUNK = 4096
+HISTORY_SUBSTEPS = 4
+
+
+def gbm_returns(rng, n, dt_years, mu=0.0, sigma=0.8):
+    """`n` GBM log returns over steps of `dt_years`."""
+    return (mu - 0.5 * sigma ** 2) * dt_years + sigma * np.sqrt(dt_years) * rng.standard_normal(n)
+
+
+def bootstrap_returns(rng, n, returns, block=60):
+    """`n` log returns resampled from `returns` in contiguous blocks."""
+    returns = np.asarray(returns, dtype="float64")
+    block = max(1, min(block, len(returns)))
+    starts = rng.integers(0, len(returns) - block + 1, size=-(-n // block))
+    idx = (starts[:, None] + np.arange(block)).ravel()[:n]
+    return returns[idx]
+
+
+def log_returns(close):
+    close = np.asarray(close, dtype="float64")
+    return np.diff(np.log(close))
+
+
+class SimMarket:
+    def __init__(self, model="gbm", s0=30000.0, mu=0.0, sigma=0.8, tick_ms=1000, returns=None, block=60,
+                 seed=None, start_ms=None, speed=1.0):
+        if model in ("bootstrap", "replay") and returns is None:
+            raise ValueError(f"model {model!r} needs recorded returns")
+        self.model = model
+        self.s0 = s0
+        self.mu = mu
+        self.sigma = sigma
+        self.tick_ms = tick_ms
+        self.returns = None if returns is None else np.asarray(returns, dtype="float64")
+        self.block = block
+        self.seed = np.random.SeedSequence(seed).entropy if seed is None else seed
+        self.start_ms = int(time.time() * 1000) if start_ms is None else start_ms
+        self.speed = speed
+        self._wall_start = time.time()
+        self._paths = {}
+        self._rngs = {}
+        self._history = {}
+
+    def now_ms(self):
+        return self.start_ms + int((time.time() - self._wall_start) * 1000 * self.speed)
+
+    def _rng(self, symbol, stream):
+        key = (symbol, stream)
+        if key not in self._rngs:
+            self._rngs[key] = np.random.default_rng([self.seed, zlib.crc32(symbol.encode()), stream])
+        return self._rngs[key]
+
+    def _next_returns(self, symbol, n, offset):
+        rng = self._rng(symbol, 0)
+        if self.model == "gbm":
+            return gbm_returns(rng, n, self.tick_ms / YEAR_MS, self.mu, self.sigma)
+        if self.model == "bootstrap":
+            return bootstrap_returns(rng, n, self.returns, self.block)
+        return self.returns[(offset + np.arange(n)) % len(self.returns)]
+
+    def _ensure(self, symbol, index):
+        """Extend `symbol`'s tick path to cover `index`; returns the path."""
+        path = self._paths.get(symbol)
+        if path is None:
+            path = np.array([self.s0])
+        if index >= len(path):
+            # Always draw whole CHUNKs so the path does not depend on request timing.
+            parts = [path]
+            size = len(path)
+            while size <= index:
+                steps = np.exp(np.cumsum(self._next_returns(symbol, CHUNK, size - 1)))
+                parts.append(parts[-1][-1] * steps)
+                size += CHUNK
+            path = np.concatenate(parts)
+        self._paths[symbol] = path
+        return path
+
+    def _index(self, t_ms):
+        return max(0, (t_ms - self.start_ms) // self.tick_ms)
+
+    def price(self, symbol, t_ms=None):
+        i = self._index(self.now_ms() if t_ms is None else t_ms)
+        return float(self._ensure(symbol, i)[i])
+
+    def _history_bars(self, symbol, timeframe, bars):
+        """GBM bars before start_ms whose last close is the first tick."""
+        key = (symbol, timeframe)
+        if key not in self._history:
+            bar_ms = timeframe_ms(timeframe)
+            rng = self._rng(symbol, 1 + zlib.crc32(timeframe.encode()))
+            r = gbm_returns(rng, bars * HISTORY_SUBSTEPS, bar_ms / HISTORY_SUBSTEPS / YEAR_MS, self.mu, self.sigma)
+            ticks = np.exp(np.concatenate([[0.0], np.cumsum(r)]))
+            ticks *= self.s0 / ticks[-1]
+            groups = np.lib.stride_tricks.sliding_window_view(ticks, HISTORY_SUBSTEPS + 1)[::HISTORY_SUBSTEPS]
+            first = self.start_ms // bar_ms * bar_ms - bars * bar_ms
+            ts = first + bar_ms * np.arange(bars)
+            volume = rng.uniform(1, 10, bars)
+            self._history[key] = np.column_stack([ts, groups[:, 0], groups.max(axis=1), groups.min(axis=1),
+                                                  groups[:, -1], volume])
+        return self._history[key]
+
+    def _tick_bars(self, symbol, bar_ms, start_bar, end_ms):
+        """Bars from the tick path between start_bar and end_ms (last one open)."""
+        first = max(start_bar, self.start_ms // bar_ms * bar_ms)
+        if first > end_ms:
+            return np.empty((0, 6))
+        hi = self._index(end_ms)
+        path = self._ensure(symbol, hi)[:hi + 1]
+        tick_ts = self.start_ms + self.tick_ms * np.arange(len(path))
+        lo = int(np.searchsorted(tick_ts, first))
+        tick_ts, path = tick_ts[lo:], path[lo:]
+        if not len(path):
+            return np.empty((0, 6))
+        bar_ts = tick_ts // bar_ms * bar_ms
+        starts = np.flatnonzero(np.r_[True, bar_ts[1:] != bar_ts[:-1]])
+        # Activity follows the size of each move, so volume is reproducible too.
+        volume = 0.001 + np.abs(np.diff(np.log(path), prepend=np.log(path[0]))) * 100
+        return np.column_stack([
+            bar_ts[starts],
+            path[starts],
+            np.maximum.reduceat(path, starts),
+            np.minimum.reduceat(path, starts),
+            path[np.r_[starts[1:] - 1, len(path) - 1]],
+            np.add.reduceat(volume, starts),
+        ])
+
+    def ohlcv(self, symbol, timeframe, since=None, limit=None, history=1000):
+        """ccxt-style [[ts, o, h, l, c, v], ...] up to the current (open) bar."""
+        bar_ms = timeframe_ms(timeframe)
+        now = self.now_ms()
+        limit = limit or 500
+        if since is None:
+            since = (now // bar_ms - limit + 1) * bar_ms
+        since = since // bar_ms * bar_ms
+        past = self._history_bars(symbol, timeframe, history)
+        past = past[past[:, 0] >= since]
+        live = self._tick_bars(symbol, bar_ms, since, now)
+        rows = np.concatenate([past, live])[:limit]
+        return [[int(r[0]), *map(float, r[1:])] for r in rows]
+
+
+class SimExchange(FakeExchange):
+    id = "sim"
+    has = {**FakeExchange.has, "fetchOHLCV": True, "fetchTickers": True}
+
+    def __init__(self, market=None, fee_rate=0.001, spread_bps=2.0, impact_bps=5.0, depth=250_000.0,
+                 ack_ms=40.0, fill_ms=60.0, jitter=0.5, fail_rate=0.0, lost_ack_rate=0.0, seed=None, **market_args):
+        super().__init__(fee_rate=fee_rate, spread=spread_bps / 1e4, fail_rate=fail_rate,
+                         lost_ack_rate=lost_ack_rate, seed=seed)
+        self.market = market or SimMarket(seed=seed, **market_args)
+        self.impact_bps = impact_bps
+        self.depth = depth
+        self.ack_ms = ack_ms
+        self.fill_ms = fill_ms
+        self.jitter = jitter
+        self._latency_rng = np.random.default_rng([self.market.seed, 3])
+
+    def milliseconds(self):
+        return self.market.now_ms()
+
+    def parse_timeframe(self, timeframe):
+        return timeframe_ms(timeframe) // 1000
+
+    def price(self, symbol):
+        return self.market.price(symbol)
+
+    def _latency(self, kind):
+        mean = self.ack_ms if kind == "ack" else self.fill_ms
+        # Lognormal with the given mean; `jitter` is the log-space sigma.
+        return float(self._latency_rng.lognormal(np.log(mean) - self.jitter ** 2 / 2, self.jitter)) / 1000
+
+    def _fill_price(self, order):
+        """Touch price at fill time plus square-root market impact."""
+        price = super()._fill_price(order)
+        impact = self.impact_bps / 1e4 * np.sqrt(price * order["amount"] / self.depth)
+        return price * (1 + impact) if order["side"] == "buy" else price * (1 - impact)
+
+    async def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None, params=None):
+        await asyncio.sleep(self._latency("ack"))
+        return self.market.ohlcv(symbol, timeframe, since, limit)
+
+    async def fetch_ticker(self, symbol):
+        await asyncio.sleep(self._latency("ack"))
+        return await super().fetch_ticker(symbol)
+
+    async def fetch_tickers(self, symbols=None, params=None):
+        await asyncio.sleep(self._latency("ack"))
+        return {s: await super(SimExchange, self).fetch_ticker(s) for s in symbols or self.market._paths}
+
+
+def sim_exchange(cfg):
+    """SimExchange from the `sim` config section; `returns_from` names a stored series."""
+    cfg = dict(cfg or {})
+    source = cfg.pop("returns_from", None)
+    if source:
+        from bot.datastore import load_frame
+        exchange_id, symbol, timeframe = source.split(":")
+        cfg["returns"] = log_returns(load_frame(symbol, timeframe, exchange_id=exchange_id)["close"])
+    return SimExchange(**cfg)
+
+
+if __name__ == "__main__":
+    import argparse
+    from bot.broker import AsyncBroker, CandleStore
+    from bot.exchanges import SharedRateLimiter
+
+    ap = argparse.ArgumentParser(description="Drive many symbols against the simulated exchange.")
+    ap.add_argument("--symbols", type=int, default=200)
+    ap.add_argument("--timeframe", default="1m")
+    ap.add_argument("--rounds", type=int, default=5)
+    ap.add_argument("--rate-limit", type=float, default=1000.0)
+    ap.add_argument("--seed", type=int, default=7)
+    args = ap.parse_args()
+
+    async def bench():
+        broker = AsyncBroker(mode="sim", exchange=SimExchange(seed=args.seed), candles=CandleStore(),
+                             limiter=SharedRateLimiter(args.rate_limit, args.rate_limit),
+                             execution={"poll_interval": 0.05, "max_inflight": 64})
+        symbols = [f"SIM{i}/USDT" for i in range(args.symbols)]
+
+        async def one(symbol, k):
+            df = await broker.fetch_ohlcv(symbol, args.timeframe, limit=200)
+            side = "buy" if k % 2 == 0 else "sell"
+            return await broker.place_order(symbol, side, 0.01, float(df["close"].iloc[-1]))
+
+        t0 = time.perf_counter()
+        for k in range(args.rounds):
+            await asyncio.gather(*(one(s, k) for s in symbols))
+        elapsed = time.perf_counter() - t0
+        n = args.symbols * args.rounds
+        print(f"{n} fetch+order cycles over {args.symbols} symbols in {elapsed:.2f}s ({n / elapsed:.0f}/s)")
+        for key, value in broker.executor.stats().items():
+            print(f"  {key}: {value:.3f}" if isinstance(value, float) else f"  {key}: {value}")
+
+    asyncio.run(bench())
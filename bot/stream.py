@@ -0,0 +1,319 @@
+"""
+Streaming market data.
+
+A source yields trades; MarketStream folds them into candles per symbol
+and publishes events to subscriber queues:
+
+    ("trade", symbol, ts_ms, price)   for every trade
+    ("bar", symbol, [ts, o, h, l, c, v])  when a bar closes
+
+Sources:
+- CcxtProSource: exchange WebSocket trades through ccxt.pro (live).
+- ReplaySource: newline-delimited JSON trades from a local ReplayServer,
+  which replays recorded candles or a synthetic random walk so the
+  streaming path can run offline.
+"""
+import json
+import time
+import random
+import asyncio
+import logging
+from collections import deque
+
+_UNIT_MS = {"s": 1000, "m": 60_000, "h": 3_600_000, "d": 86_400_000, "w": 604_800_000}
+
+
+def timeframe_ms(timeframe):
+    """'1m' -> 60000, '4h' -> 14400000, ..."""
+    return int(timeframe[:-1]) * _UNIT_MS[timeframe[-1]]
+
+
+class CandleBuilder:
+    """OHLCV bars for one symbol built from trades; the last row is the open bar."""
+
+    def __init__(self, bar_ms, max_bars=1000):
+        self.bar_ms = bar_ms
+        self.rows = deque(maxlen=max_bars)
+
+    def seed(self, rows):
+        for r in rows:
+            if not self.rows or r[0] > self.rows[-1][0]:
+                self.rows.append(list(r))
+
+    def add_trade(self, ts, price, amount=0.0):
+        """Update the open bar; returns the bar that just closed, if any."""
+        start = ts - ts % self.bar_ms
+        if self.rows and self.rows[-1][0] == start:
+            bar = self.rows[-1]
+            bar[2] = max(bar[2], price)
+            bar[3] = min(bar[3], price)
+            bar[4] = price
+            bar[5] += amount
+            return None
+        if self.rows and start < self.rows[-1][0]:
+            return None  # late trade for a bar already closed
+        closed = list(self.rows[-1]) if self.rows else None
+        self.rows.append([start, price, price, price, price, amount])
+        return closed
+
+
+class MarketStream:
+    def __init__(self, source, timeframe, max_bars=1000):
+        self.source = source
+        self.bar_ms = timeframe_ms(timeframe)
+        self.max_bars = max_bars
+        self.builders = {}
+        self.last_price = {}
+        self._subscribers = []
+
+    def add(self, symbol, seed=None):
+        builder = self.builders.get(symbol)
+        if builder is None:
+            builder = self.builders[symbol] = CandleBuilder(self.bar_ms, self.max_bars)
+            self.source.add(symbol)
+        if seed:
+            builder.seed(seed)
+
+    def remove(self, symbol):
+        if self.builders.pop(symbol, None) is not None:
+            self.source.remove(symbol)
+
+    def subscribe(self, maxsize=10_000):
+        q = asyncio.Queue(maxsize)
+        self._subscribers.append(q)
+        return q
+
+    def candles(self, symbol, limit=200):
+        builder = self.builders.get(symbol)
+        return list(builder.rows)[-limit:] if builder else []
+
+    def _publish(self, event):
+        for q in self._subscribers:
+            if q.full():
+                # Only the newest prices matter to consumers; drop the oldest.
+                q.get_nowait()
+            q.put_nowait(event)
+
+    def on_trade(self, symbol, ts, price, amount=0.0):
+        builder = self.builders.get(symbol)
+        if builder is None:
+            return
+        closed = builder.add_trade(ts, price, amount)
+        self.last_price[symbol] = price
+        self._publish(("trade", symbol, ts, price))
+        if closed is not None:
+            self._publish(("bar", symbol, closed))
+
+    async def run(self):
+        await self.source.run(self.on_trade)
+
+
+# -------- sources --------
+class CcxtProSource:
+    """Trades from the exchange WebSocket API via ccxt.pro."""
+
+    def __init__(self, exchange_id):
+        try:
+            import ccxt.pro as ccxtpro
+        except ImportError:
+            raise RuntimeError("ccxt.pro is required for exchange streaming.") from None
+        self.exchange = getattr(ccxtpro, exchange_id)({"enableRateLimit": True})
+        self._tasks = {}
+        self._emit = None
+
+    def add(self, symbol):
+        if self._emit is not None and symbol not in self._tasks:
+            self._tasks[symbol] = asyncio.create_task(self._watch(symbol))
+        else:
+            self._tasks.setdefault(symbol, None)
+
+    def remove(self, symbol):
+        task = self._tasks.pop(symbol, None)
+        if task is not None:
+            task.cancel()
+
+    async def _watch(self, symbol):
+        while True:
+            try:
+                for t in await self.exchange.watch_trades(symbol):
+                    self._emit(symbol, t["timestamp"], float(t["price"]), float(t.get("amount") or 0.0))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logging.error(f"[{symbol}] Trade stream error: {e}")
+                await asyncio.sleep(1)
+
+    async def run(self, emit):
+        self._emit = emit
+        for symbol in list(self._tasks):
+            self._tasks[symbol] = asyncio.create_task(self._watch(symbol))
+        try:
+            await asyncio.Event().wait()
+        finally:
+            for task in self._tasks.values():
+                if task is not None:
+                    task.cancel()
+            await self.exchange.close()
+
+
+class ReplaySource:
+    """Client for ReplayServer; reconnects if the server goes away."""
+
+    def __init__(self, host="127.0.0.1", port=8765):
+        self.host = host
+        self.port = port
+        self.symbols = set()
+        self._writer = None
+
+    def _send(self, op, symbols):
+        if self._writer is not None and symbols:
+            self._writer.write((json.dumps({"op": op, "symbols": sorted(symbols)}) + "\n").encode())
+
+    def add(self, symbol):
+        self.symbols.add(symbol)
+        self._send("subscribe", [symbol])
+
+    def remove(self, symbol):
+        self.symbols.discard(symbol)
+        self._send("unsubscribe", [symbol])
+
+    async def run(self, emit):
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                self._send("subscribe", self.symbols)
+                while line := await reader.readline():
+                    try:
+                        t = json.loads(line)
+                        trade = (t["symbol"], int(t["ts"]), float(t["price"]), float(t.get("amount", 0.0)))
+                    except (ValueError, KeyError, TypeError) as e:
+                        logging.warning(f"Skipping malformed replay line {line[:200]!r}: {e}")
+                        continue
+                    emit(*trade)
+                logging.warning("Replay server closed the stream")
+            except (ConnectionError, OSError) as e:
+                logging.error(f"Replay stream error: {e}")
+            finally:
+                if self._writer is not None:
+                    self._writer.close()
+                    self._writer = None
+            await asyncio.sleep(1)
+
+
+# -------- local replay server --------
+def trades_from_candles(symbol, rows, bar_ms):
+    """Four ticks per candle: open, high/low (in the likelier order), close."""
+    for ts, o, h, l, c, v in rows:
+        first, second = (l, h) if c >= o else (h, l)
+        for k, price in enumerate((o, first, second, c)):
+            yield {"symbol": symbol, "ts": int(ts) + k * (bar_ms // 4), "price": float(price), "amount": float(v) / 4}
+
+
+def synthetic_trades(symbols, start_ms=None, interval_ms=250, price=30000.0, vol=0.0005, seed=None):
+    """Endless random-walk trades, round-robin across symbols."""
+    rng = random.Random(seed)
+    ts = int(time.time() * 1000) if start_ms is None else start_ms
+    prices = {s: price for s in symbols}
+    while True:
+        for s in symbols:
+            prices[s] *= 1 + rng.gauss(0, vol)
+            yield {"symbol": s, "ts": ts, "price": prices[s], "amount": rng.uniform(0.001, 0.1)}
+        ts += interval_ms
+
+
+class ReplayServer:
+    """
+    Serves `trades` (dicts sorted by ts) as JSON lines to every client,
+    filtered by each client's subscriptions. `speed` scales the recorded
+    gaps between trades (2.0 = twice real time); None replays flat out.
+    """
+
+    def __init__(self, trades, host="127.0.0.1", port=8765, speed=1.0):
+        self.trades = trades
+        self.host = host
+        self.port = port
+        self.speed = speed
+        self._clients = {}
+        self._ready = asyncio.Event()
+        self._server = None
+        self._task = None
+
+    async def _handle(self, reader, writer):
+        subs = self._clients[writer] = set()
+        try:
+            while line := await reader.readline():
+                msg = json.loads(line)
+                if msg.get("op") == "subscribe":
+                    subs.update(msg.get("symbols", []))
+                    self._ready.set()
+                elif msg.get("op") == "unsubscribe":
+                    subs.difference_update(msg.get("symbols", []))
+        except (ConnectionError, ValueError):
+            pass
+        finally:
+            self._clients.pop(writer, None)
+            writer.close()
+
+    async def _replay(self):
+        await self._ready.wait()
+        prev_ts = None
+        for n, t in enumerate(self.trades):
+            if self.speed and prev_ts is not None and t["ts"] > prev_ts:
+                await asyncio.sleep((t["ts"] - prev_ts) / 1000 / self.speed)
+            elif n % 1000 == 0:
+                await asyncio.sleep(0)
+            prev_ts = t["ts"]
+            line = (json.dumps(t) + "\n").encode()
+            for writer, subs in list(self._clients.items()):
+                if t["symbol"] in subs:
+                    writer.write(line)
+                    if writer.transport.get_write_buffer_size() > 1 << 20:
+                        await writer.drain()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self._task = asyncio.create_task(self._replay())
+        return self
+
+    async def stop(self):
+        self._task.cancel()
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._task
+        finally:
+            await self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Local trade replay server for streaming mode.")
+    ap.add_argument("--symbols", default="BTC/USDT")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--speed", type=float, default=1.0)
+    ap.add_argument("--exchange-id", default="coinbasepro", help="replay stored candles of this exchange")
+    ap.add_argument("--timeframe", help="replay stored candles of this timeframe instead of a random walk")
+    args = ap.parse_args()
+
+    symbols = [s.strip() for s in args.symbols.split(",") if s.strip()]
+    if args.timeframe:
+        import heapq
+        from bot.datastore import OHLCVStore
+
+        store, bar_ms = OHLCVStore(), timeframe_ms(args.timeframe)
+        feeds = []
+        for s in symbols:
+            cols = store.series(args.exchange_id, s, args.timeframe).columns()
+            rows = zip(*(cols[c].tolist() for c in ("timestamp", "open", "high", "low", "close", "volume")))
+            feeds.append(trades_from_candles(s, rows, bar_ms))
+        trades = heapq.merge(*feeds, key=lambda t: t["ts"])
+    else:
+        trades = synthetic_trades(symbols)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s | %(levelname)s | %(message)s")
+    logging.info(f"Replaying {', '.join(symbols)} on {args.host}:{args.port}")
+    asyncio.run(ReplayServer(trades, args.host, args.port, args.speed).serve_forever())
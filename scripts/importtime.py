@@ -0,0 +1,95 @@
+"""
+Import-time benchmark for the bot's entry points.
+
+Imports each module in a fresh interpreter under `python -X importtime`
+(best of --repeat runs) and prints the total, the slowest imports by
+cumulative time, and any heavy optional package that was loaded although
+it should be deferred until its mode or channel is used.
+
+    python scripts/importtime.py                      # run_bot, bot.runtime
+    python scripts/importtime.py --json out.json      # record a run
+    python scripts/importtime.py --baseline out.json  # compare against it
+    python scripts/importtime.py --budget-ms 800       # exit 1 when over
+"""
+import os
+import sys
+import json
+import argparse
+import subprocess
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+ENTRY_POINTS = ("run_bot", "bot.runtime")
+DEFERRED = ("ccxt", "requests", "smtplib", "email", "http.server", "plotly", "ai_engine")
+
+
+def parse(stderr):
+    """[(module, self_us, cumulative_us)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(self_us), int(cumulative)))
+    return rows
+
+
+def measure(module, repeat):
+    best = None
+    for _ in range(repeat):
+        proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                              cwd=ROOT, env={**os.environ, "PYTHONPATH": str(ROOT)},
+                              capture_output=True, text=True)
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+            return {"module": module, "error": error}
+        rows = parse(proc.stderr)
+        total = next(c for name, _, c in reversed(rows) if name == module)
+        if best is None or total < best["total_us"]:
+            best = {"module": module, "total_us": total, "rows": rows}
+    loaded = {name for name, _, _ in best["rows"]}
+    best["deferred_loaded"] = sorted(d for d in DEFERRED if any(n == d or n.startswith(d + ".") for n in loaded))
+    return best
+
+
+def report(result, top, baseline=None):
+    module = result["module"]
+    if "error" in result:
+        print(f"{module}: import failed ({result['error']})")
+        return
+    line = f"{module}: {result['total_us'] / 1000:.1f} ms"
+    if baseline and module in baseline:
+        before = baseline[module]
+        line += f" (baseline {before / 1000:.1f} ms, {100 * (result['total_us'] - before) / before:+.0f}%)"
+    print(line)
+    for name, self_us, cumulative in sorted(result["rows"], key=lambda r: -r[2])[1:top + 1]:
+        print(f"  {cumulative / 1000:8.1f} ms cumulative {self_us / 1000:7.1f} ms self  {name}")
+    if result["deferred_loaded"]:
+        print(f"  imported eagerly: {', '.join(result['deferred_loaded'])}")
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Track import time of the bot's entry points.")
+    ap.add_argument("modules", nargs="*", default=list(ENTRY_POINTS))
+    ap.add_argument("--repeat", type=int, default=5)
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--json", help="write {module: total_us} here")
+    ap.add_argument("--baseline", help="compare against a file written with --json")
+    ap.add_argument("--budget-ms", type=float, help="fail when an entry point takes longer")
+    args = ap.parse_args()
+
+    baseline = json.loads(Path(args.baseline).read_text()) if args.baseline else None
+    results = [measure(m, args.repeat) for m in args.modules]
+    for result in results:
+        report(result, args.top, baseline)
+    ok = [r for r in results if "error" not in r]
+    if args.json:
+        Path(args.json).write_text(json.dumps({r["module"]: r["total_us"] for r in ok}, indent=2))
+    over = [r["module"] for r in ok if args.budget_ms is not None and r["total_us"] / 1000 > args.budget_ms]
+    if over:
+        print(f"over the {args.budget_ms:.0f} ms budget: {', '.join(over)}")
+    return 1 if over or len(ok) < len(results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())